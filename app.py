@@ -144,17 +144,22 @@
 
 
 
+import logging
+import os
 import pandas as pd
 import streamlit as st
 import asyncio
-import aiohttp
-from concurrent.futures import ThreadPoolExecutor
+from parsing_scripts.http_client import run, limiter_stats
 from parsing_scripts.valid_username_check import valid_letterboxd_username
-from parsing_scripts.dates_from_diary import grab_date_info
-from parsing_scripts.grab_title_details import grab_title_details
+from parsing_scripts.dates_from_diary import grab_date_info, grab_new_date_info
 from parsing_scripts.diary_movie_info import grab_diary_movie_info_async
 from parsing_scripts.liked_movie_info import grab_liked_movie_info_async
-from parsing_scripts.update_liked_df import update_liked_movies_with_slugs
+from parsing_scripts.update_liked_df import update_liked_movies_with_slugs, update_new_liked_movies
+from parsing_scripts.film_page import parse_film_page, film_page_end
+from parsing_scripts.single_flight import SingleFlightFetcher
+from parsing_scripts.user_snapshot import load_snapshot, save_snapshot, extend_snapshot, refresh_snapshot_films
+from parsing_scripts.merge_frames import merge_diary_and_likes
+from parsing_scripts.film_model import build_film_model, memory_usage
 
 from visualize_scripts.genre_stats import calculate_total_watched_time
 from visualize_scripts.genre_stats import genre_stats
@@ -164,89 +169,141 @@ from visualize_scripts.studios_stats import studio_stats
 from visualize_scripts.release_year_stats import release_year_stats
 from visualize_scripts.countries_stats import countries_stats
 
+logger = logging.getLogger(__name__)
+
+# Streamlit only sets up its own loggers, so the scrape's coverage, request and cache stats
+# reach the server log only when LETTERSTATS_LOG_LEVEL (e.g. INFO) asks for them
+if os.environ.get("LETTERSTATS_LOG_LEVEL"):
+    logging.basicConfig(level=os.environ["LETTERSTATS_LOG_LEVEL"].upper(), format="%(asctime)s %(name)s %(levelname)s: %(message)s")
+
 st.set_page_config(page_title="LetterStats", page_icon="🍿")
 
 if 'refresh_trigger' not in st.session_state:
     st.session_state['refresh_trigger'] = 0
 
-if st.button("↻", key="refresh_button", help="Refresh Cache (warning: this will cause it to gather the data again)"):
+if st.button("↻", key="refresh_button", help="Refresh (only entries added since the last load are gathered)"):
     st.session_state['refresh_trigger'] += 1
     st.rerun()
 
-if 'diary_df' not in st.session_state:
-    st.session_state['diary_df'] = pd.DataFrame()
-if 'liked_df' not in st.session_state:
-    st.session_state['liked_df'] = pd.DataFrame()
+if st.button("⟲", key="full_reload_button", help="Full reload (the whole history is gathered again)"):
+    st.session_state['refresh_trigger'] += 1
+    st.session_state['full_reload_trigger'] = st.session_state['refresh_trigger']
+    st.rerun()
 
 pd.set_option('future.no_silent_downcasting', True)
+# frames derived from the cached film model share its data until written, so helpers never copy to protect it
+pd.set_option('mode.copy_on_write', True)
+
+PAGE_QUEUE_SIZE = 4
+# any of these in a run's coverage means some entries are missing from it
+INCOMPLETE_COVERAGE = ("failed_diary_pages", "failed_liked_pages", "failed_film_pages", "failed_title_lookups", "failed_rows")
+
+def scrape_frames(username, first_diary_page=None, full_reload=False):
+    # with a snapshot from an earlier run only pages newer than it are walked and only new films enriched
+    snapshot = None if full_reload else load_snapshot(username)
 
-def run_asyncio_tasks(username, diary_df, liked_df):
+    # diary pages, slug probes, like pages and film pages are all in flight together;
+    # each page's rows are enriched as soon as the page is parsed
     async def async_wrapper():
-        semaphore = asyncio.Semaphore(15)
-        async with aiohttp.ClientSession() as session:
-            diary_task = asyncio.create_task(grab_diary_movie_info_async(diary_df, session, semaphore))
-            liked_task = asyncio.create_task(grab_liked_movie_info_async(username, liked_df, session, semaphore))
-            updated_diary_df, updated_liked_df = await asyncio.gather(diary_task, liked_task)
-            return updated_diary_df, updated_liked_df
-    with ThreadPoolExecutor() as executor:
-        future = executor.submit(asyncio.run, async_wrapper())
-        updated_diary_df, updated_liked_df = future.result()
-        updated_liked_df.replace("", pd.NA, inplace=True)
-        liked_titles_set = set(updated_liked_df['title'])
-        updated_diary_df['liked'] = updated_diary_df['title'].apply(lambda title: title in liked_titles_set)
-        final_df = pd.merge(updated_diary_df, updated_liked_df, on=['title', 'watched_date', 'release_year', 'title_slug', 'url', 'genres', 'director', 'cast', 'countries', 'studios', 'primary_language', 'spoken_languages', 'runtime', 'rating'], how='outer', suffixes=('', '_liked'))
-        final_df['liked'] = final_df.apply(lambda row: True if pd.notna(row.get('liked_liked')) else row['liked'], axis=1)
-        final_df.drop(columns=['liked_liked'], inplace=True)
-        duplicate_marker = final_df.duplicated(subset=[
-            "title", "release_year", "genres", "director", "cast",
-            "countries", "studios", "primary_language", "spoken_languages",
-            "runtime", "liked"
-        ], keep=False) 
-        final_df.drop_duplicates(subset=['title', 'watched_date', 'release_year', 'title_slug', 'url', 'genres', 'director', 'cast', 'countries', 'studios', 'primary_language', 'spoken_languages', 'runtime', 'rating', 'liked'], inplace=True)
-        duplicate_marker = duplicate_marker & final_df['watched_date'].isna()
-        final_df = final_df[~duplicate_marker]
-        final_df.reset_index(drop=True, inplace=True)
-        return final_df
+        film_fetcher = SingleFlightFetcher(parse_film_page, find_end=film_page_end)
+        # bounded, and each producer fetches through a few page workers, so producers wait for enrichment
+        # instead of fetching and parsing the whole history ahead of it
+        diary_pages = asyncio.Queue(maxsize=PAGE_QUEUE_SIZE)
+        liked_pages = asyncio.Queue(maxsize=PAGE_QUEUE_SIZE)
+        if snapshot is None:
+            diary_producer = grab_date_info(username, diary_pages, first_diary_page)
+            liked_producer = update_liked_movies_with_slugs(username, liked_pages)
+        else:
+            diary_producer = grab_new_date_info(username, diary_pages, snapshot, first_diary_page)
+            liked_producer = update_new_liked_movies(username, liked_pages, snapshot)
+        # the snapshot's films are re-read through the film cache alongside the scrape
+        snapshot_task = asyncio.create_task(refresh_snapshot_films(snapshot, film_fetcher)) if snapshot is not None else None
+        diary_result, liked_result, (new_diary_df, failed_title_lookups, failed_diary_rows), (new_liked_df, failed_liked_rows) = await asyncio.gather(
+            diary_producer,
+            liked_producer,
+            grab_diary_movie_info_async(username, diary_pages, film_fetcher),
+            grab_liked_movie_info_async(username, liked_pages, film_fetcher, ratings_grid=snapshot is None),
+        )
+        refreshed_snapshot = await snapshot_task if snapshot_task else None
+        logger.info("film pages for %s: %s", username, film_fetcher.stats())
+        logger.info("http for %s: %s", username, limiter_stats())
+        coverage = {
+            "failed_diary_pages": len(diary_result[2]),
+            "failed_liked_pages": len(liked_result[1]),
+            "film_pages_fetched": len(film_fetcher.results) - len(film_fetcher.failed),
+            "failed_film_pages": len(film_fetcher.failed),
+            "failed_title_lookups": failed_title_lookups,
+            "failed_rows": failed_diary_rows + failed_liked_rows,
+        }
+        return diary_result, liked_result, new_diary_df, new_liked_df, coverage, refreshed_snapshot
+    (diary_page_hash, known_entries, _), (liked_page_hash, _), diary_df, liked_df, coverage, refreshed_snapshot = run(async_wrapper())
+    logger.info("coverage for %s: %s", username, coverage)
+
+    if refreshed_snapshot is not None:
+        logger.info("incremental refresh for %s: %d new diary entries, %d new likes", username, len(diary_df), len(liked_df))
+        diary_df, liked_df = extend_snapshot(refreshed_snapshot, diary_df, liked_df, known_entries)
+    # an incomplete run is not snapshotted, so the next refresh walks the missing part again
+    if not any(coverage[key] for key in INCOMPLETE_COVERAGE):
+        save_snapshot(username, diary_df, liked_df, diary_page_hash, liked_page_hash, snapshot["saved_at"] if snapshot is not None else None)
+    return diary_df, liked_df, coverage
+
+def run_asyncio_tasks(username, first_diary_page=None, full_reload=False):
+    updated_diary_df, updated_liked_df, coverage = scrape_frames(username, first_diary_page, full_reload)
+    final_df = merge_diary_and_likes(updated_diary_df, updated_liked_df)
+    return final_df, coverage
     
 @st.cache_data
-def construct_final_df(username, diary_df, liked_df, refresh_trigger):
-    diary_df = grab_date_info(username, diary_df)
-    diary_df = grab_title_details(username, diary_df)
-    liked_df = update_liked_movies_with_slugs(username, liked_df)
-
-    final_df = run_asyncio_tasks(username, diary_df, liked_df)
-    return final_df
+def construct_film_model(username, refresh_trigger, full_reload=False, _first_diary_page=None):
+    # only the typed model is kept (in the cache and the session), the scraped frames are dropped here
+    final_df, coverage = run_asyncio_tasks(username, _first_diary_page, full_reload)
+    film_model = build_film_model(final_df)
+    logger.info("film model for %s: %d events, %.1f KB", username, len(film_model.events), memory_usage(film_model) / 1024)
+    return film_model, coverage
 
 def fetch_and_display_films(username):
-    is_valid = valid_letterboxd_username(username)
+    # a diary page 1 fetched by this check is handed straight to the scrape, never kept for a later run
+    is_valid, first_diary_page = valid_letterboxd_username(username)
     if not is_valid:
         return
     
-    if 'final_df' not in st.session_state:
-        st.session_state['final_df'] = pd.DataFrame()
-
-    if username and username != st.session_state.get('last_username', ''):
-        st.session_state['last_username'] = username
+    if username and (username, st.session_state['refresh_trigger']) != st.session_state.get('last_load'):
+        st.session_state['last_load'] = (username, st.session_state['refresh_trigger'])
 
         loading_message = st.empty()
         loading_message.info("This may take a couple mins depending on how many movies you've watched...")
 
-        final_df = construct_final_df(username, st.session_state['diary_df'], st.session_state['liked_df'], st.session_state['refresh_trigger'])
+        full_reload = st.session_state.get('full_reload_trigger') == st.session_state['refresh_trigger']
+        film_model, coverage = construct_film_model(username, st.session_state['refresh_trigger'], full_reload, first_diary_page)
 
-        st.session_state['final_df'] = final_df
+        st.session_state['film_model'] = film_model
+        st.session_state['coverage'] = coverage
 
         loading_message.empty()
 
-        if not final_df.empty:
+    # a rerun (any widget on the page) draws from the stored model; the panels' cached results make that cheap
+    if username and 'film_model' in st.session_state:
+        film_model = st.session_state['film_model']
+        coverage = st.session_state['coverage']
+
+        if any(coverage[key] for key in INCOMPLETE_COVERAGE):
+            st.warning(
+                f"Couldn't load {coverage['failed_diary_pages']} diary page(s), {coverage['failed_liked_pages']} likes page(s), {coverage['failed_film_pages']} of "
+                f"{coverage['film_pages_fetched'] + coverage['failed_film_pages']} film page(s), {coverage['failed_title_lookups']} diary entries' film links "
+                f"and {coverage['failed_rows']} other entries, so some stats may be incomplete. "
+                "Hit ↻ to try again."
+            )
+
+        if not film_model.events.empty:
             # st.write(final_df.to_html(escape=False), unsafe_allow_html=True)
             st.write(f"<h1><i>{username}</i>'s LetterStats 🍿</h1>", unsafe_allow_html=True)
-            calculate_total_watched_time(st.session_state['final_df'])
-            genre_stats(st.session_state['final_df'])
-            cast_stats(st.session_state['final_df'])
-            director_stats(st.session_state['final_df'])
-            studio_stats(st.session_state['final_df'])
-            release_year_stats(st.session_state['final_df'])
-            countries_stats(st.session_state['final_df'])
+            calculate_total_watched_time(st.session_state['film_model'])
+            # each panel computes and draws only while its expander is open, and opening one reruns just that panel
+            genre_stats(st.session_state['film_model'])
+            cast_stats(st.session_state['film_model'])
+            director_stats(st.session_state['film_model'])
+            studio_stats(st.session_state['film_model'])
+            release_year_stats(st.session_state['film_model'])
+            countries_stats(st.session_state['film_model'])
         else:
             st.write("Can't seem to find any entries...")
     else:
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import time
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATUSES = {429, 503}
+
+def parse_retry_after(value):
+    if not value:
+        return 0
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0
+
+class AdaptiveLimiter:
+    # AIMD: the limit creeps up by about one slot per round trip while latency stays near
+    # the best seen, and is cut multiplicatively on throttling, errors or a latency spike
+    def __init__(self, initial_limit=8, min_limit=2, max_limit=30, latency_tolerance=2.0, backoff=0.5):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.in_flight = 0
+        self.baseline_latency = None
+        self.smoothed_latency = None
+        self.paused_until = 0
+        self.last_decrease = 0
+        self.completed = 0
+        self.throttled = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self.waiters = []
+
+    # everything runs on the client's event loop thread, so plain counters need no lock
+    async def acquire(self):
+        while True:
+            wait = self.paused_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            elif self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            else:
+                waiter = asyncio.get_running_loop().create_future()
+                self.waiters.append(waiter)
+                try:
+                    await waiter
+                finally:
+                    if waiter in self.waiters:
+                        self.waiters.remove(waiter)
+
+    def release(self, latency, status, retry_after=None):
+        self.in_flight -= 1
+        if status is None:
+            self.failed += 1
+            self.decrease("error")
+        elif status in THROTTLE_STATUSES:
+            self.throttled += 1
+            pause = parse_retry_after(retry_after)
+            if pause:
+                self.paused_until = max(self.paused_until, time.monotonic() + pause)
+            self.decrease(f"status {status}")
+        else:
+            self.completed += 1
+            self.observe_latency(latency)
+
+        # waiters re-check the limit themselves, so waking all of them is safe
+        waiters, self.waiters = self.waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def observe_latency(self, latency):
+        if self.baseline_latency is None:
+            self.baseline_latency = self.smoothed_latency = latency
+            return
+        # the baseline slowly forgets its minimum so a permanently slower network is not read as congestion
+        self.baseline_latency = min(latency, self.baseline_latency * 1.001)
+        self.smoothed_latency = 0.8 * self.smoothed_latency + 0.2 * latency
+        if self.smoothed_latency <= self.baseline_latency * self.latency_tolerance:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        else:
+            self.decrease("latency", factor=0.9)
+
+    def decrease(self, reason, factor=None):
+        # every request already in flight sees the same congestion, so only cut once per round trip
+        now = time.monotonic()
+        if now - self.last_decrease < (self.smoothed_latency or 0):
+            return
+        self.last_decrease = now
+        self.limit = max(self.min_limit, self.limit * (factor or self.backoff))
+        logger.debug("concurrency limit lowered to %.1f (%s)", self.limit, reason)
+
+    def stats(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "limit": round(self.limit, 1),
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "throttled": self.throttled,
+            "failed": self.failed,
+            "requests_per_second": round(self.completed / elapsed, 1),
+            "smoothed_latency": round(self.smoothed_latency, 3) if self.smoothed_latency else None,
+        }
+
+ENRICH_WORKERS = 32
+# list pages a producer may have in flight or parsed and waiting on a full page queue
+PAGE_FETCHERS = 8
+
+async def consume_pages(page_queue, load_page, handle_row, workers=ENRICH_WORKERS):
+    # a fixed pool of workers drains rows as their page arrives, so nothing is created per row up
+    # front and the bounded row queue pushes back on the producers when enrichment falls behind.
+    # Returns the enriched rows and how many rows failed; a failure never stops the page queue draining.
+    row_queue = asyncio.Queue(maxsize=workers * 2)
+    results = []
+    failed_rows = 0
+
+    async def worker():
+        nonlocal failed_rows
+        while True:
+            position, row, context = await row_queue.get()
+            try:
+                result = await handle_row(row, context)
+            except Exception:
+                # a failed row must not take its worker down with it, or the row queue stops draining
+                # and the producers block on it forever
+                logger.exception("enriching a row failed")
+                failed_rows += 1
+                result = None
+            finally:
+                row_queue.task_done()
+            if result is not None:
+                results.append((position, result))
+
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    position = 0
+    try:
+        while True:
+            rows = await page_queue.get()
+            if rows is None:
+                break
+            try:
+                context = await load_page(rows)
+            except Exception:
+                logger.exception("loading a page of %d rows failed", len(rows))
+                failed_rows += len(rows)
+                continue
+            for row in rows:
+                await row_queue.put((position, row, context))
+                position += 1
+        await row_queue.join()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # rows finish out of order; keep them in the order the pages listed them
+    results.sort(key=lambda item: item[0])
+    return [result for _, result in results], failed_rows
+
+async def for_each_bounded(items, handle, workers=ENRICH_WORKERS):
+    item_queue = asyncio.Queue()
+    for item in items:
+        item_queue.put_nowait(item)
+
+    async def worker():
+        while not item_queue.empty():
+            await handle(item_queue.get_nowait())
+
+    await asyncio.gather(*[worker() for _ in range(min(workers, item_queue.qsize()))])
@@ -1,67 +1,156 @@
-import requests
+import re
 from bs4 import BeautifulSoup
-import multiprocessing
-import pandas as pd
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from parsing_scripts.concurrency import PAGE_FETCHERS, for_each_bounded
+from parsing_scripts.http_client import fetch_page
+from parsing_scripts.ratings import parse_rating
+from parsing_scripts.user_snapshot import diary_entry_key, entries_hash, parse_watched_date
 
-def process_page_combined(username, page_number):
-    entries = []
+def diary_page_url(username, page_number):
     if page_number == 1:
-        url = f"https://letterboxd.com/{username}/films/diary/"
-    else:
-        url = f"https://letterboxd.com/{username}/films/diary/page/{page_number}/"
-
-    response = requests.get(url)
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.text, "lxml")
-        diary_entries_raw = soup.find_all("tr", class_="diary-entry-row")
-        for movie_entry in diary_entries_raw:
-            movie_info = {}
-            title_container = movie_entry.find("td", class_="td-film-details")
-            if title_container:
-                title_element = title_container.find("h3", class_="headline-3").find("a")
-                if title_element:
-                    movie_info["title"] = title_element.text.strip()
-
-            date_info = movie_entry.find("td", class_="td-calendar")
-            if date_info:
-                month = date_info.find("a")
-                year = date_info.find("small")
-                if month and year:
-                    current_month = month.text.strip()
-                    current_year = year.text.strip()
-
-            day_info = movie_entry.find("td", class_="td-day")
-            if day_info:
-                day = day_info.find("a").text.strip()
-
-            movie_info["watched_date"] = f"{day} {current_month} {current_year}"
-
-            release_year_container = movie_entry.find("td", class_="td-released")
-            if release_year_container:
-                movie_info["release_year"] = release_year_container.find("span").text.strip()
-
-            if "title" in movie_info and "watched_date" in movie_info and "release_year" in movie_info:
-                entries.append(movie_info)
-    return entries
-
-def grab_date_info(username, diary_df):
-    url = f"https://letterboxd.com/{username}/films/diary/"
-    response = requests.get(url)
-    last_page = 1
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.text, "lxml")
-        finding_last_page = soup.find_all("li", class_="paginate-page")
-        if finding_last_page:
-            last_page_li = finding_last_page[-1]
-            last_page = int(last_page_li.find("a").text.strip())
+        return f"https://letterboxd.com/{username}/films/diary/"
+    return f"https://letterboxd.com/{username}/films/diary/page/{page_number}/"
 
+async def process_page_combined(username, page_number, html=None):
+    if html is None:
+        status, html = await fetch_page(diary_page_url(username, page_number))
+        if status != 200:
+            return None, None
+    # list pages are small enough that shipping them to the parse pool costs more than parsing them here
+    return parse_diary_page(html)
+
+def parse_diary_page(html):
     entries = []
-    workers = multiprocessing.cpu_count() * 5
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        future_to_page = {executor.submit(process_page_combined, username, page_number): page_number for page_number in range(1, last_page + 1)}
-        for future in as_completed(future_to_page):
-            entries.extend(future.result())
-
-    diary_df = pd.DataFrame(entries)
-    return diary_df
+    soup = BeautifulSoup(html, "lxml")
+    diary_entries_raw = soup.find_all("tr", class_="diary-entry-row")
+    for movie_entry in diary_entries_raw:
+        movie_info = {}
+        title_container = movie_entry.find("td", class_="td-film-details")
+        if title_container:
+            title_element = title_container.find("h3", class_="headline-3").find("a")
+            if title_element:
+                movie_info["title"] = title_element.text.strip()
+                viewing_link = title_element.get("href")
+                if viewing_link:
+                    movie_info["url"] = f"https://letterboxd.com{viewing_link}"
+
+            film_poster = title_container.find("div", class_="film-poster")
+            if film_poster and film_poster.get("data-film-slug"):
+                movie_info["title_slug"] = film_poster["data-film-slug"]
+
+        actions_container = movie_entry.find("td", class_="td-actions")
+        if actions_container:
+            if "title_slug" not in movie_info and actions_container.get("data-film-slug"):
+                movie_info["title_slug"] = actions_container["data-film-slug"]
+            if "url" not in movie_info and actions_container.get("data-viewing-link"):
+                movie_info["url"] = f"https://letterboxd.com{actions_container['data-viewing-link']}"
+
+        if "title_slug" not in movie_info and "url" in movie_info:
+            slug_match = re.search(r"/film/([^/]+)/", movie_info["url"])
+            if slug_match:
+                movie_info["title_slug"] = slug_match.group(1)
+
+        date_info = movie_entry.find("td", class_="td-calendar")
+        if date_info:
+            month = date_info.find("a")
+            year = date_info.find("small")
+            if month and year:
+                current_month = month.text.strip()
+                current_year = year.text.strip()
+
+        day_info = movie_entry.find("td", class_="td-day")
+        if day_info:
+            day = day_info.find("a").text.strip()
+
+        movie_info["watched_date"] = f"{day} {current_month} {current_year}"
+
+        release_year_container = movie_entry.find("td", class_="td-released")
+        if release_year_container:
+            movie_info["release_year"] = release_year_container.find("span").text.strip()
+
+        rating_container = movie_entry.find("td", class_="td-rating")
+        if rating_container:
+            rating_element = rating_container.find("span", class_="rating")
+            rating = parse_rating(rating_element) if rating_element else None
+            if rating is not None:
+                movie_info["rating"] = rating
+
+        like_container = movie_entry.find("td", class_="td-like")
+        movie_info["liked"] = bool(like_container and like_container.find(class_="icon-liked"))
+
+        rewatch_container = movie_entry.find("td", class_="td-rewatch")
+        movie_info["rewatch"] = bool(rewatch_container and "icon-status-off" not in rewatch_container.get("class", []))
+
+        if "title" in movie_info and "watched_date" in movie_info and "release_year" in movie_info:
+            entries.append(movie_info)
+
+    last_page = 1
+    finding_last_page = soup.find_all("li", class_="paginate-page")
+    if finding_last_page:
+        last_page_li = finding_last_page[-1]
+        last_page = int(last_page_li.find("a").text.strip())
+
+    return entries, last_page
+
+async def grab_date_info(username, page_queue, first_page=None):
+    page_hash = None
+    failed_pages = []
+
+    # each page's entries go downstream as soon as that page is parsed
+    async def queue_page(page_number):
+        entries, _ = await process_page_combined(username, page_number)
+        if entries is None:
+            failed_pages.append(page_number)
+        elif entries:
+            await page_queue.put(entries)
+
+    try:
+        # page 1 gives both its own entries and the pagination
+        entries, last_page = await process_page_combined(username, 1, first_page)
+        if entries is None:
+            return None, [], [1]
+        page_hash = entries_hash(entries)
+        if entries:
+            await page_queue.put(entries)
+        await for_each_bounded(range(2, last_page + 1), queue_page, workers=PAGE_FETCHERS)
+
+        # pages that failed even after fetch_page's retries get one more pass once the rest are in
+        retry_pages, failed_pages = failed_pages, []
+        await for_each_bounded(retry_pages, queue_page, workers=PAGE_FETCHERS)
+    finally:
+        await page_queue.put(None)
+    return page_hash, [], failed_pages
+
+async def grab_new_date_info(username, page_queue, snapshot, first_page=None):
+    known_keys = {diary_entry_key(entry) for entry in snapshot["diary_df"].to_dict("records")}
+    newest_date = snapshot["newest_watched_date"]
+    page_hash = snapshot["diary_page_hash"]
+    known_entries = []
+    failed_pages = []
+
+    try:
+        page_number = 1
+        while True:
+            entries, _ = await process_page_combined(username, page_number, first_page if page_number == 1 else None)
+            if entries is None:
+                failed_pages.append(page_number)
+                break
+            if page_number == 1:
+                page_hash = entries_hash(entries)
+                if page_hash == snapshot["diary_page_hash"]:
+                    break
+
+            new_entries = [entry for entry in entries if diary_entry_key(entry) not in known_keys]
+            known_entries.extend(entry for entry in entries if diary_entry_key(entry) in known_keys)
+            if new_entries:
+                await page_queue.put(new_entries)
+
+            # the diary is newest first, so nothing new can be further back than a page holding known or older entries
+            reached_snapshot = len(new_entries) < len(entries) or (
+                newest_date is not None and any(parse_watched_date(entry["watched_date"]) < newest_date for entry in entries)
+            )
+            if not entries or reached_snapshot:
+                break
+            page_number += 1
+    finally:
+        await page_queue.put(None)
+    return page_hash, known_entries, failed_pages
@@ -0,0 +1,88 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+import pandas as pd
+
+SCHEMA_VERSION = 2
+CACHE_TTL_SECONDS = 60 * 60 * 24 * 30
+CACHE_PATH = os.environ.get(
+    "LETTERSTATS_FILM_CACHE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "film_cache.sqlite3"),
+)
+
+# sqlite caps the number of bound parameters per statement
+LOOKUP_BATCH_SIZE = 500
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+def create_schema(connection):
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS films ("
+        "title_slug TEXT PRIMARY KEY, "
+        "schema_version INTEGER NOT NULL, "
+        "fetched_at REAL NOT NULL, "
+        "details TEXT NOT NULL)"
+    )
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS user_snapshots ("
+        "username TEXT PRIMARY KEY, "
+        "schema_version INTEGER NOT NULL, "
+        "saved_at REAL NOT NULL, "
+        "newest_watched_date TEXT, "
+        "diary_page_hash TEXT, "
+        "liked_page_hash TEXT, "
+        "diary TEXT NOT NULL, "
+        "liked TEXT NOT NULL)"
+    )
+
+def connect():
+    global _schema_ready
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    connection = sqlite3.connect(CACHE_PATH, timeout=30)
+    # switching to WAL needs an exclusive lock, so only the first connection in the process does it
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                create_schema(connection)
+                _schema_ready = True
+    return connection
+
+def load_cached_films(title_slugs):
+    slugs = list({slug for slug in title_slugs if isinstance(slug, str) and slug})
+    if not slugs:
+        return {}
+
+    cutoff = time.time() - CACHE_TTL_SECONDS
+    films = {}
+    with closing(connect()) as connection:
+        for start in range(0, len(slugs), LOOKUP_BATCH_SIZE):
+            batch = slugs[start:start + LOOKUP_BATCH_SIZE]
+            placeholders = ", ".join("?" * len(batch))
+            rows = connection.execute(
+                f"SELECT title_slug, details FROM films WHERE title_slug IN ({placeholders}) AND schema_version = ? AND fetched_at >= ?",
+                (*batch, SCHEMA_VERSION, cutoff),
+            )
+            for title_slug, details in rows:
+                films[title_slug] = json.loads(details)
+    return films
+
+def store_films(films):
+    rows = []
+    now = time.time()
+    for title_slug, film in films.items():
+        details = {key: value for key, value in film.items() if isinstance(value, list) or not pd.isna(value)}
+        if title_slug and details:
+            rows.append((title_slug, SCHEMA_VERSION, now, json.dumps(details)))
+
+    if not rows:
+        return
+    with closing(connect()) as connection, connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO films (title_slug, schema_version, fetched_at, details) VALUES (?, ?, ?, ?)",
+            rows,
+        )
@@ -0,0 +1,99 @@
+from typing import Dict, NamedTuple
+import hashlib
+import numpy as np
+import pandas as pd
+
+FILM_COLUMNS = ["title_slug", "title", "release_year", "runtime", "primary_language"]
+EVENT_COLUMNS = ["watched_date", "rating", "liked", "rewatch", "url"]
+FACETS = ["genres", "cast", "director", "countries", "studios", "spoken_languages"]
+
+# the facet panels have always left out names containing "show"
+HIDDEN_NAME = "show"
+
+class FilmModel(NamedTuple):
+    # film_id is a row of films, entity_id a position in that facet's entities
+    films: pd.DataFrame
+    events: pd.DataFrame
+    links: Dict[str, pd.DataFrame]
+    entities: Dict[str, pd.Index]
+    # content hash, the cache key for everything computed from the model
+    fingerprint: str
+
+def build_film_model(final_df):
+    # one event per diary entry or liked-only film; film details are stored once per film and
+    # each multi-valued field becomes a film_id -> entity_id link table
+    if "title_slug" not in final_df:
+        final_df = final_df.assign(title_slug=pd.Series(dtype=object))
+    final_df = final_df[final_df["title_slug"].notna()]
+    film_ids, _ = pd.factorize(final_df["title_slug"])
+    first_rows = final_df.drop_duplicates(subset="title_slug")
+    films = first_rows.reindex(columns=FILM_COLUMNS + FACETS).reset_index(drop=True)
+
+    events = final_df.reindex(columns=EVENT_COLUMNS).reset_index(drop=True)
+    events.insert(0, "film_id", film_ids.astype(np.int32))
+
+    links = {}
+    entities = {}
+    for facet in FACETS:
+        names = films[facet].explode().dropna()
+        entity_ids, uniques = pd.factorize(names.to_numpy())
+        links[facet] = pd.DataFrame({"film_id": names.index.to_numpy(dtype=np.int32), "entity_id": entity_ids.astype(np.int32)})
+        entities[facet] = pd.Index(uniques, dtype=object)
+
+    films = compact_films(films.drop(columns=FACETS))
+    events = compact_events(events)
+    return FilmModel(films, events, links, entities, model_fingerprint(films, events, links, entities))
+
+def model_fingerprint(films, events, links, entities):
+    # hashed column by column in vectorized passes, so it costs far less than any panel
+    digest = hashlib.blake2b(digest_size=16)
+    tables = [("films", films), ("events", events)] + [(facet, links[facet]) for facet in FACETS]
+    for name, table in tables:
+        digest.update(name.encode())
+        digest.update(pd.util.hash_pandas_object(table, index=False).to_numpy().tobytes())
+    for facet in FACETS:
+        digest.update(pd.util.hash_array(entities[facet].to_numpy()).tobytes())
+    return digest.hexdigest()
+
+def compact_films(films):
+    # runtime needs Int32, a few films on letterboxd run longer than 32767 minutes
+    return films.assign(
+        release_year=pd.to_numeric(films["release_year"], errors="coerce").astype("Int16"),
+        runtime=pd.to_numeric(films["runtime"], errors="coerce").astype("Int32"),
+        primary_language=films["primary_language"].astype("category"),
+    )
+
+def compact_events(events):
+    # ratings are half stars from 1 to 10; an unreadable rating was stored as ""
+    return events.assign(
+        watched_date=pd.to_datetime(events["watched_date"], format="%d %b %Y", errors="coerce"),
+        rating=pd.to_numeric(events["rating"], errors="coerce").astype("Int8"),
+        liked=events["liked"].fillna(False).astype(bool),
+        rewatch=events["rewatch"].astype("boolean"),
+    )
+
+def memory_usage(model):
+    tables = [model.films, model.events, *model.links.values()]
+    return sum(int(table.memory_usage(deep=True).sum()) for table in tables) + sum(int(names.memory_usage(deep=True)) for names in model.entities.values())
+
+def event_films(model):
+    return model.events.join(model.films, on="film_id")
+
+def film_names(model, facet):
+    # every film's names for one facet, in the order its page listed them
+    link = model.links[facet]
+    names = pd.Series(model.entities[facet].take(link["entity_id"]), index=link["film_id"])
+    return names.groupby(level=0).agg(list)
+
+def facet_frame(model, facet, keep_hidden=False):
+    # long format: one row per event and name, with the event's columns and the film's title
+    link = model.links[facet]
+    names = model.entities[facet]
+    if not keep_hidden:
+        hidden = np.asarray(names.str.contains(HIDDEN_NAME, case=False), dtype=bool)
+        link = link[~hidden[link["entity_id"].to_numpy()]]
+
+    rows = model.events.rename_axis("event_id").reset_index().merge(link, on="film_id")
+    rows[facet] = names.take(rows["entity_id"]).to_numpy()
+    rows["title"] = model.films["title"].to_numpy()[rows["film_id"].to_numpy()]
+    return rows
@@ -0,0 +1,174 @@
+import os
+import re
+from typing import List, NamedTuple, Optional
+from bs4 import BeautifulSoup
+from lxml import etree
+import pandas as pd
+
+def film_url(title_slug):
+    return f"https://letterboxd.com/film/{title_slug}/"
+
+def film_page_end(body):
+    # only the footer paragraph itself counts, the same element the lxml backend stops at,
+    # so a page cut here parses exactly like the full page
+    match = FOOTER_TAG.search(body)
+    if match is None:
+        return None
+    end = body.find(b"</p>", match.end())
+    return None if end == -1 else end + len(b"</p>")
+
+# multi-valued fields stay lists of names, joining them would break names that contain a comma ("Sammy Davis, Jr.")
+class FilmDetails(NamedTuple):
+    release_year: Optional[str] = None
+    genres: Optional[List[str]] = None
+    cast: Optional[List[str]] = None
+    director: Optional[List[str]] = None
+    countries: Optional[List[str]] = None
+    studios: Optional[List[str]] = None
+    primary_language: Optional[str] = None
+    spoken_languages: Optional[List[str]] = None
+    runtime: Optional[int] = None
+
+# the header's "Directed by" links are plain contributor links, so only sluglist links count for these
+SLUG_LINK_FIELDS = (
+    ("/films/genre/", "genres"),
+    ("/actor/", "cast"),
+    ("/director/", "director"),
+    ("/films/country/", "countries"),
+)
+LINK_FIELDS = (
+    ("/studio/", "studios"),
+    ("/films/language/", "languages"),
+)
+
+# film pages are parsed with lxml's pull parser unless LETTERSTATS_PARSER=soup asks for the BeautifulSoup reference
+PARSER_BACKEND = os.environ.get("LETTERSTATS_PARSER", "lxml")
+FEED_CHUNK_SIZE = 64 * 1024
+
+# every field comes from above the runtime footer, so a download can stop once it closes
+FOOTER_TAG = re.compile(rb"""<p\s[^>]*\bclass=["'][^"']*(?<![\w-])text-footer(?![\w-])[^>]*>""")
+
+def parse_runtime(runtime_text):
+    match = re.search(r'(\d+,?)+', runtime_text)
+    if match:
+        return int(match.group().replace(',', ''))
+    return None
+
+class FilmLinks:
+    # backend-independent: each backend reports the page's links in document order
+    def __init__(self):
+        self.links = {field: [] for _, field in SLUG_LINK_FIELDS + LINK_FIELDS}
+        self.release_year = None
+        self.runtime_text = None
+
+    def add_link(self, href, classes, text, parent_tag, parent_classes):
+        if not href.startswith("/"):
+            return
+
+        if self.release_year is None and href.startswith("/films/year/") and parent_tag == "small" and "number" in parent_classes:
+            self.release_year = text
+            return
+
+        if "text-slug" in classes:
+            for prefix, field in SLUG_LINK_FIELDS:
+                if href.startswith(prefix):
+                    self.links[field].append(text)
+                    break
+        for prefix, field in LINK_FIELDS:
+            if href.startswith(prefix):
+                self.links[field].append(text)
+                break
+
+    def details(self):
+        links = dict(self.links)
+        languages = links.pop("languages")
+        primary_language = languages[0] if languages else None
+        spoken_languages = [language for language in languages if language != primary_language]
+
+        return FilmDetails(
+            release_year=self.release_year,
+            primary_language=primary_language,
+            spoken_languages=spoken_languages or None,
+            runtime=parse_runtime(self.runtime_text) if self.runtime_text else None,
+            **{field: values or None for field, values in links.items()},
+        )
+
+def extract_with_soup(html):
+    # reference backend: a full BeautifulSoup tree, walked once
+    soup = BeautifulSoup(html, "lxml")
+    film_links = FilmLinks()
+    for link in soup.find_all("a", href=True):
+        parent = link.parent
+        if film_links.runtime_text is None and parent.name == "p" and "text-footer" in parent.get("class", ()):
+            film_links.runtime_text = parent.get_text()
+        film_links.add_link(link["href"], link.get("class", ()), link.text, parent.name, parent.get("class", ()))
+
+    if film_links.runtime_text is None:
+        runtime_container = soup.find("p", class_="text-footer")
+        if runtime_container:
+            film_links.runtime_text = runtime_container.get_text()
+    return film_links.details()
+
+class StreamingFilmPageParser:
+    # lean backend: lxml builds its C tree incrementally and only <a> and <p> closings reach Python.
+    # Everything we read sits above the runtime footer, so parsing stops once that footer closes.
+    def __init__(self):
+        self.parser = etree.HTMLPullParser(events=("end",), tag=("a", "p"))
+        self.film_links = FilmLinks()
+        self.done = False
+
+    def feed(self, chunk):
+        if not self.done:
+            self.parser.feed(chunk)
+            self.read_events()
+        return self.done
+
+    def read_events(self):
+        for _, element in self.parser.read_events():
+            classes = (element.get("class") or "").split()
+            if element.tag == "a":
+                href = element.get("href")
+                if href:
+                    parent = element.getparent()
+                    parent_classes = (parent.get("class") or "").split() if parent is not None else ()
+                    parent_tag = parent.tag if parent is not None else None
+                    self.film_links.add_link(href, classes, "".join(element.itertext()), parent_tag, parent_classes)
+            elif "text-footer" in classes:
+                self.film_links.runtime_text = "".join(element.itertext())
+                self.done = True
+                return
+
+    def close(self):
+        if not self.done:
+            self.parser.close()
+            self.read_events()
+        return self.film_links.details()
+
+def extract_with_lxml(html):
+    parser = StreamingFilmPageParser()
+    for start in range(0, len(html), FEED_CHUNK_SIZE):
+        if parser.feed(html[start:start + FEED_CHUNK_SIZE]):
+            break
+    return parser.close()
+
+BACKENDS = {
+    "soup": extract_with_soup,
+    "lxml": extract_with_lxml,
+}
+
+def extract_film_details(html, backend=None):
+    return BACKENDS[backend or PARSER_BACKEND](html)
+
+def parse_film_page(html):
+    if not html:
+        return {}
+
+    details = extract_film_details(html)
+    film = {}
+    for field, value in details._asdict().items():
+        if value is not None:
+            film[field] = value
+        # rows keep a spoken_languages column even when no film has a second language
+        elif field == "spoken_languages" and details.primary_language is not None:
+            film[field] = pd.NA
+    return film
@@ -1,9 +1,7 @@
-import requests
 import pandas as pd
-import multiprocessing
 from unidecode import unidecode
 import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from parsing_scripts.http_client import RETRY_STATUSES, fetch_page
 
 def format_title_to_url_slug(title):
     if pd.isnull(title):
@@ -24,59 +22,52 @@ def format_title_to_url_slug(title):
 
         return(slug)
 
-def fetch_details_for_row(args):
-    username, index, row = args
-    title = format_title_to_url_slug(row['title'])
-    release_year = row['release_year']
+async def url_exists(url):
+    # None when the request failed even after fetch_page's retries, which says nothing about the url
+    status, _ = await fetch_page(url)
+    if status is None or status in RETRY_STATUSES:
+        return None
+    return status == 200
 
+def candidate_urls(username, title, release_year):
     url_with_year = f"https://letterboxd.com/{username}/film/{title}-{release_year}/"
     base_url = f"https://letterboxd.com/{username}/film/{title}/"
 
-    response_with_year = requests.get(url_with_year)
-    if response_with_year.status_code == 200:
-        final_slug, final_url = f"{title}-{release_year}", url_with_year
-    else:
-        response = requests.get(base_url)
-        if response.status_code == 200:
-            final_slug, final_url = title, base_url
-        else:
-            final_slug, final_url = "peepee", "poopoo"
-            for i in range(1, 10):
-                url_with_suffix = f"{base_url}{i}/"
-                response_with_suffix = requests.get(url_with_suffix)
-                if response_with_suffix.status_code == 200:
-                    final_slug, final_url = title, url_with_suffix
-                    break
-                else:
-                    url_with_year_and_suffix = f"{url_with_year}{i}/"
-                    response_with_url_and_suffix = requests.get(url_with_year_and_suffix)
-                    if response_with_url_and_suffix.status_code == 200:
-                        final_slug, final_url = title, url_with_year_and_suffix
-                        break
-                    else:
-                        url_with_double_suffix = f"https://letterboxd.com/{username}/film/{title}-{release_year}-{i}/"
-                        response_with_double_suffix = requests.get(url_with_double_suffix)
-                        if response_with_double_suffix.status_code == 200:
-                            final_slug, final_url = title, url_with_double_suffix
-                            break
-            else:
-                return index, None, None
-    
-    return index, final_slug, final_url
+    yield f"{title}-{release_year}", url_with_year
+    yield title, base_url
+    for i in range(1, 10):
+        yield title, f"{base_url}{i}/"
+        yield title, f"{url_with_year}{i}/"
+        yield title, f"https://letterboxd.com/{username}/film/{title}-{release_year}-{i}/"
 
+async def fetch_details_for_row(username, row):
+    # (slug, url) for the first candidate that exists, (None, None) when none does,
+    # and None when a candidate couldn't be checked, since a later match might then be the wrong film
+    title = format_title_to_url_slug(row['title'])
+    for final_slug, final_url in candidate_urls(username, title, row['release_year']):
+        exists = await url_exists(final_url)
+        if exists is None:
+            return None
+        if exists:
+            return final_slug, final_url
+    return None, None
 
-def grab_title_details(username, diary_df):
-    workers = multiprocessing.cpu_count() * 5
-    keep_indices = []
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        futures = [executor.submit(fetch_details_for_row, (username, index, row)) for index, row in diary_df.iterrows()]
-        
-        for future in as_completed(futures):
-            index, final_slug, final_url = future.result()
-            if final_slug is not None and final_url is not None:
-                keep_indices.append(index)
-                diary_df.at[index, 'title_slug'] = final_slug
-                diary_df.at[index, "url"] = final_url
-                
-    filtered_diary_df = diary_df.loc[keep_indices]
-    return filtered_diary_df
+
+def has_slug_from_diary(row):
+    return isinstance(row.get("title_slug"), str) and isinstance(row.get("url"), str)
+
+async def grab_title_details(username, entry, failed_entries):
+    if has_slug_from_diary(entry):
+        return entry
+
+    details = await fetch_details_for_row(username, entry)
+    if details is None:
+        failed_entries.append(entry)
+        return None
+    final_slug, final_url = details
+    if final_slug is None or final_url is None:
+        return None
+
+    entry["title_slug"] = final_slug
+    entry["url"] = final_url
+    return entry
@@ -0,0 +1,106 @@
+import asyncio
+import codecs
+import random
+import threading
+import time
+import aiohttp
+from parsing_scripts.concurrency import AdaptiveLimiter
+
+MAX_CONNECTIONS = 30
+DNS_CACHE_SECONDS = 300
+KEEPALIVE_SECONDS = 30
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=30, sock_connect=10)
+MAX_ATTEMPTS = 3
+RETRY_BASE_SECONDS = 0.5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+STREAM_CHUNK_SIZE = 16 * 1024
+HEADERS = {"Accept-Encoding": "gzip, deflate"}
+
+# one event loop thread owns the session, so every stage and every Streamlit
+# session shares the same connection pool, DNS cache and concurrency limit
+_loop = None
+_loop_lock = threading.Lock()
+_session = None
+_limiter = None
+
+def event_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="letterstats-http", daemon=True).start()
+    return _loop
+
+def run(coroutine):
+    return asyncio.run_coroutine_threadsafe(coroutine, event_loop()).result()
+
+def get_session():
+    global _session, _limiter
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, ttl_dns_cache=DNS_CACHE_SECONDS, keepalive_timeout=KEEPALIVE_SECONDS)
+        _session = aiohttp.ClientSession(connector=connector, headers=HEADERS, auto_decompress=True, timeout=REQUEST_TIMEOUT)
+        _limiter = AdaptiveLimiter(max_limit=MAX_CONNECTIONS)
+    return _session
+
+def limiter_stats():
+    return _limiter.stats() if _limiter else {}
+
+async def read_until(response, find_end):
+    # find_end returns the offset just past everything the caller needs, or None while that has not arrived;
+    # leaving the response unread makes aiohttp close the connection instead of downloading the rest.
+    # Also says whether anything of the page was actually left unread.
+    body = bytearray()
+    stopped_early = False
+    async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+        body.extend(chunk)
+        end = find_end(body)
+        if end is not None:
+            stopped_early = end < len(body) or not response.content.at_eof()
+            del body[end:]
+            break
+    return body.decode(body_encoding(response), errors="replace"), stopped_early
+
+def body_encoding(response):
+    # a charset the codecs module doesn't know falls back to utf-8 instead of raising
+    try:
+        return codecs.lookup(response.charset or "utf-8").name
+    except LookupError:
+        return "utf-8"
+
+async def fetch_once(url, find_end=None):
+    session = get_session()
+    limiter = _limiter
+    await limiter.acquire()
+    started = time.monotonic()
+    status, retry_after = None, None
+    try:
+        async with session.get(url) as response:
+            status = response.status
+            retry_after = response.headers.get("Retry-After")
+            if status != 200:
+                return status, None, False
+            if find_end:
+                html, stopped_early = await read_until(response, find_end)
+                return status, html, stopped_early
+            # a body that doesn't match its declared charset is decoded with replacement characters, not raised
+            return status, await response.text(errors="replace"), False
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        status = None
+        return None, None, False
+    finally:
+        limiter.release(time.monotonic() - started, status, retry_after)
+
+async def fetch_page_until(url, find_end=None):
+    # a hung or reset connection is retried with jittered backoff and then reported as
+    # (None, None, False) instead of raising, so one bad page never aborts a whole gather
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        status, html, stopped_early = await fetch_once(url, find_end)
+        if status is not None and status not in RETRY_STATUSES:
+            break
+        if attempt < MAX_ATTEMPTS:
+            await asyncio.sleep(random.uniform(0, RETRY_BASE_SECONDS * 2 ** attempt))
+    return status, html, stopped_early
+
+async def fetch_page(url):
+    status, html, _ = await fetch_page_until(url)
+    return status, html
@@ -1,240 +1,61 @@
-# import re
-# from bs4 import BeautifulSoup
-# import pandas as pd
-# # import pycountry
-# import asyncio
-
-# # def get_iso_alpha_3(country_name):
-# #     try:
-# #         country = pycountry.countries.lookup(country_name)
-# #         return country.alpha_3
-# #     except LookupError:
-# #         return None
-
-# async def fetch_url(session, url):
-#     async with session.get(url) as response:
-#         return await response.text()
-
-# async def grab_liked_movie_info_async(username, liked_df, session):
-#     tasks = []
-#     updates = []
-#     for index, row in liked_df.iterrows():
-#         title_slug = row["title_slug"]
-#         main_url = f"https://letterboxd.com/film/{title_slug}/"
-#         rating_url = f"https://letterboxd.com/{username}/film/{title_slug}/"
-
-#         main_task = asyncio.create_task(fetch_url(session, main_url))
-#         rating_task = asyncio.create_task(fetch_url(session, rating_url))
-
-#         tasks.append((index, "main", main_task))
-#         tasks.append((index, "rating", rating_task))
-
-#     responses = await asyncio.gather(*[task for _, _, task in tasks])
-
-#     for (index, task_type, _), response in zip(tasks, responses):
-#         update = {'index': index}
-#         if response:
-#             soup = BeautifulSoup(response, "lxml")
-
-#             if task_type == "main":
-#                 year_container = soup.find("small", class_ = "number")
-#                 if year_container:
-#                     update["release_year"] = year_container.find("a").text
-                
-#                 genre_main_container = soup.find("div", {"id": "tab-genres"})
-#                 if genre_main_container:
-#                     genre_container = genre_main_container.find("div", class_="text-sluglist")
-#                     if genre_container:
-#                         update["genres"] = ", ".join(a.text for a in genre_container.find_all("a", class_="text-slug"))
-
-#                 cast_main_container = soup.find("div", class_="cast-list text-sluglist")
-#                 if cast_main_container:
-#                     cast = [a.text for a in cast_main_container.find_all("a", class_="text-slug")]
-#                     update["cast"] = ", ".join(cast)
-
-#                 director_main_container = soup.find("div", {"id": "tab-crew"})
-#                 if director_main_container:
-#                     director_container = director_main_container.find("div", class_="text-sluglist")
-#                     if director_container:
-#                         directors = director_container.find_all("a", class_="text-slug")
-#                         if directors:
-#                             update["director"] = ", ".join(director.text for director in directors)
-
-#                 country_containers = soup.find_all("a", class_="text-slug", href=lambda value: value and value.startswith("/films/country/"))
-#                 if country_containers:
-#                     update["countries"] = ", ".join(country.text for country in country_containers)
-#                     # countries_iso = []
-#                     # for country in country_containers:
-#                     #     country_name = country.text
-#                     #     iso_alpha_3 = get_iso_alpha_3(country_name)
-#                     #     if iso_alpha_3: 
-#                     #         countries_iso.append(iso_alpha_3)
-#                     # update["countries"] = ", ".join(countries_iso)
-
-#                 studios_container = soup.find_all("a", href=lambda value: value and value.startswith("/studio/"))
-#                 if studios_container:
-#                     update["studios"] = ", ".join(studios.text for studios in studios_container)
-
-#                 language_containers = soup.find_all("a", href=lambda value: value and value.startswith("/films/language/"))
-#                 if language_containers:
-#                     update["primary_language"] = language_containers[0].text if language_containers else pd.NA
-#                     if len(language_containers) > 1:
-#                         primary_language = language_containers[0].text
-#                         spoken_languages = [language.text for language in language_containers if language.text != primary_language]
-#                         update["spoken_languages"] = ", ".join(spoken_languages) if spoken_languages else pd.NA
-
-#                 runtime_container = soup.find("p", class_="text-footer")
-#                 if runtime_container:
-#                     runtime_text = runtime_container.get_text()
-#                     # match = re.search(r'\d+', runtime_text)
-#                     # if match:
-#                     #     runtime_minutes = int(match.group())
-#                     #     update["runtime"] = runtime_minutes
-#                     match = re.search(r'(\d+,?)+', runtime_text)
-#                     if match:
-#                         runtime_minutes = int(match.group().replace(',', ''))
-#                         update["runtime"] = runtime_minutes
-
-#             elif task_type == "rating":
-#                 rating_conversion = {
-#                     "½": 1,
-#                     "★": 2,
-#                     "★½": 3,
-#                     "★★": 4,
-#                     "★★½": 5,
-#                     "★★★": 6,
-#                     "★★★½": 7,
-#                     "★★★★": 8,
-#                     "★★★★½": 9,
-#                     "★★★★★": 10
-#                 }
-#                 rating_element = soup.find("span", class_="rating")
-#                 if rating_element:
-#                     rating_text = re.sub(r'\s+', '', rating_element.text.strip())
-#                     update["rating"] = rating_conversion.get(rating_text, "")
-
-#         if update: 
-#             updates.append(update)
-
-#     for update in updates:
-#         index = update.pop('index')
-#         for key, value in update.items():
-#             liked_df.at[index, key] = value
-
-#     return liked_df
-
-
-
-
-
-
-import re
 from bs4 import BeautifulSoup
-import pandas as pd
 import asyncio
-
-async def fetch_url(session, url, semaphore):
-    async with semaphore:  
-        async with session.get(url) as response:
-            return await response.text()
-
-async def grab_liked_movie_info_async(username, liked_df, session, semaphore):
-    tasks = []
-    updates = []
-    for index, row in liked_df.iterrows():
-        title_slug = row["title_slug"]
-        main_url = f"https://letterboxd.com/film/{title_slug}/"
-        rating_url = f"https://letterboxd.com/{username}/film/{title_slug}/"
-
-        main_task = asyncio.create_task(fetch_url(session, main_url, semaphore))
-        rating_task = asyncio.create_task(fetch_url(session, rating_url, semaphore))
-
-        tasks.append((index, "main", main_task))
-        tasks.append((index, "rating", rating_task))
-
-    responses = await asyncio.gather(*[task for _, _, task in tasks])
-
-    for (index, task_type, _), response in zip(tasks, responses):
-        update = {'index': index}
-        if response:
-            soup = BeautifulSoup(response, "lxml")
-
-            if task_type == "main":
-                year_container = soup.find("small", class_ = "number")
-                if year_container:
-                    update["release_year"] = year_container.find("a").text
-                
-                genre_main_container = soup.find("div", {"id": "tab-genres"})
-                if genre_main_container:
-                    genre_container = genre_main_container.find("div", class_="text-sluglist")
-                    if genre_container:
-                        update["genres"] = ", ".join(a.text for a in genre_container.find_all("a", class_="text-slug"))
-
-                cast_main_container = soup.find("div", class_="cast-list text-sluglist")
-                if cast_main_container:
-                    cast = [a.text for a in cast_main_container.find_all("a", class_="text-slug")]
-                    update["cast"] = ", ".join(cast)
-
-                director_main_container = soup.find("div", {"id": "tab-crew"})
-                if director_main_container:
-                    director_container = director_main_container.find("div", class_="text-sluglist")
-                    if director_container:
-                        directors = director_container.find_all("a", class_="text-slug")
-                        if directors:
-                            update["director"] = ", ".join(director.text for director in directors)
-
-                country_containers = soup.find_all("a", class_="text-slug", href=lambda value: value and value.startswith("/films/country/"))
-                if country_containers:
-                    update["countries"] = ", ".join(country.text for country in country_containers)
-
-                studios_container = soup.find_all("a", href=lambda value: value and value.startswith("/studio/"))
-                if studios_container:
-                    update["studios"] = ", ".join(studios.text for studios in studios_container)
-
-                language_containers = soup.find_all("a", href=lambda value: value and value.startswith("/films/language/"))
-                if language_containers:
-                    update["primary_language"] = language_containers[0].text if language_containers else pd.NA
-                    if len(language_containers) > 1:
-                        primary_language = language_containers[0].text
-                        spoken_languages = [language.text for language in language_containers if language.text != primary_language]
-                        update["spoken_languages"] = ", ".join(spoken_languages) if spoken_languages else pd.NA
-
-                runtime_container = soup.find("p", class_="text-footer")
-                if runtime_container:
-                    runtime_text = runtime_container.get_text()
-                    # match = re.search(r'\d+', runtime_text)
-                    # if match:
-                    #     runtime_minutes = int(match.group())
-                    #     update["runtime"] = runtime_minutes
-                    match = re.search(r'(\d+,?)+', runtime_text)
-                    if match:
-                        runtime_minutes = int(match.group().replace(',', ''))
-                        update["runtime"] = runtime_minutes
-
-            elif task_type == "rating":
-                rating_conversion = {
-                    "½": 1,
-                    "★": 2,
-                    "★½": 3,
-                    "★★": 4,
-                    "★★½": 5,
-                    "★★★": 6,
-                    "★★★½": 7,
-                    "★★★★": 8,
-                    "★★★★½": 9,
-                    "★★★★★": 10
-                }
-                rating_element = soup.find("span", class_="rating")
-                if rating_element:
-                    rating_text = re.sub(r'\s+', '', rating_element.text.strip())
-                    update["rating"] = rating_conversion.get(rating_text, "")
-
-        if update: 
-            updates.append(update)
-
-    for update in updates:
-        index = update.pop('index')
-        for key, value in update.items():
-            liked_df.at[index, key] = value
-
-    return liked_df
\ No newline at end of file
+import pandas as pd
+from parsing_scripts.concurrency import consume_pages, for_each_bounded
+from parsing_scripts.diary_movie_info import retry_failed_films
+from parsing_scripts.film_cache import load_cached_films, store_films
+from parsing_scripts.film_page import film_url
+from parsing_scripts.http_client import fetch_page
+from parsing_scripts.parse_pool import parse_in_pool
+from parsing_scripts.liked_ratings import grab_liked_ratings_async
+from parsing_scripts.ratings import parse_rating
+
+async def enrich_liked_row(row, cached_films, fetched_films, fetcher):
+    title_slug = row["title_slug"]
+    film = cached_films.get(title_slug)
+    if film is None:
+        film = await fetcher.get(film_url(title_slug))
+        if film:
+            fetched_films[title_slug] = film
+    row.update(film)
+
+def parse_liked_rating(html):
+    soup = BeautifulSoup(html, "lxml")
+    rating_element = soup.find("span", class_="rating")
+    return parse_rating(rating_element) if rating_element else None
+
+async def fetch_liked_rating(username, row):
+    _, response = await fetch_page(f"https://letterboxd.com/{username}/film/{row['title_slug']}/")
+    if response:
+        rating = await parse_in_pool(parse_liked_rating, response)
+        if rating is not None:
+            row["rating"] = rating
+
+async def grab_liked_movie_info_async(username, page_queue, fetcher, ratings_grid=True):
+    # the ratings grid covers every rated film, which only pays off when most likes are being scraped
+    ratings_task = asyncio.create_task(grab_liked_ratings_async(username)) if ratings_grid else None
+    fetched_films = {}
+
+    async def load_page(page_rows):
+        return await asyncio.to_thread(load_cached_films, [row["title_slug"] for row in page_rows])
+
+    async def handle_row(row, cached_films):
+        await enrich_liked_row(row, cached_films, fetched_films, fetcher)
+        return row
+
+    rows, failed_rows = await consume_pages(page_queue, load_page, handle_row)
+
+    liked_ratings, ratings_complete = await ratings_task if ratings_task else ({}, False)
+    unrated_rows = []
+    for row in rows:
+        if row["title_slug"] in liked_ratings:
+            row["rating"] = liked_ratings[row["title_slug"]]
+        # a film missing from a fully fetched ratings grid is unrated, so per-film requests are only needed when the grid is incomplete
+        elif not ratings_complete:
+            unrated_rows.append(row)
+
+    await for_each_bounded(unrated_rows, lambda row: fetch_liked_rating(username, row))
+    await retry_failed_films(rows, fetched_films, fetcher, dict.update)
+    await asyncio.to_thread(store_films, fetched_films)
+
+    return pd.DataFrame(rows), failed_rows
\ No newline at end of file
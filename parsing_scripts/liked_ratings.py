@@ -0,0 +1,44 @@
+import asyncio
+from bs4 import BeautifulSoup
+from parsing_scripts.http_client import fetch_page
+from parsing_scripts.ratings import parse_rating
+
+def parse_ratings_page(html):
+    soup = BeautifulSoup(html, "lxml")
+    ratings = {}
+    for poster_container in soup.find_all("li", class_="poster-container"):
+        film_poster = poster_container.find("div", class_="film-poster")
+        rating_element = poster_container.find("span", class_="rating")
+        if film_poster and film_poster.get("data-film-slug") and rating_element:
+            rating = parse_rating(rating_element)
+            if rating is not None:
+                ratings[film_poster["data-film-slug"]] = rating
+
+    last_page = 1
+    finding_last_page = soup.find_all("li", class_="paginate-page")
+    if finding_last_page:
+        last_page = int(finding_last_page[-1].find("a").text.strip())
+
+    return ratings, last_page
+
+async def grab_liked_ratings_async(username):
+    _, first_page = await fetch_page(f"https://letterboxd.com/{username}/films/ratings/")
+    if first_page is None:
+        return {}, False
+
+    ratings, last_page = parse_ratings_page(first_page)
+    page_tasks = [
+        fetch_page(f"https://letterboxd.com/{username}/films/ratings/page/{page_number}/")
+        for page_number in range(2, last_page + 1)
+    ]
+    pages = await asyncio.gather(*page_tasks, return_exceptions=True)
+
+    complete = True
+    for page in pages:
+        if isinstance(page, Exception) or page[1] is None:
+            complete = False
+            continue
+        page_ratings, _ = parse_ratings_page(page[1])
+        ratings.update(page_ratings)
+
+    return ratings, complete
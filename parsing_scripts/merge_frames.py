@@ -0,0 +1,30 @@
+import pandas as pd
+
+DIARY_ENTRY_KEY = ["title_slug", "watched_date", "url", "rating"]
+
+def non_empty_concat(frames):
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+def merge_diary_and_likes(diary_df, liked_df):
+    # everything is keyed on title_slug, so two films that share a title stay apart
+    liked_df = liked_df.replace("", pd.NA)
+    liked_slugs = liked_df["title_slug"] if "title_slug" in liked_df else pd.Series(dtype=object)
+
+    if "title_slug" in diary_df:
+        diary_df = diary_df.drop_duplicates(subset=[column for column in DIARY_ENTRY_KEY if column in diary_df])
+        diary_liked = diary_df["title_slug"].isin(liked_slugs)
+        if "liked" in diary_df:
+            diary_liked = diary_liked | diary_df["liked"].fillna(False).astype(bool)
+        diary_df = diary_df.assign(liked=diary_liked)
+        diary_slugs = diary_df["title_slug"]
+    else:
+        diary_slugs = pd.Series(dtype=object)
+
+    # a liked film that was also logged is already represented by its diary rows
+    if "title_slug" in liked_df:
+        liked_df = liked_df[~liked_df["title_slug"].isin(diary_slugs)].drop_duplicates(subset="title_slug").assign(liked=True)
+
+    return non_empty_concat([diary_df, liked_df])
@@ -0,0 +1,45 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# one core is left for the event loop and Streamlit itself
+PARSE_WORKERS = max(1, (os.cpu_count() or 1) - 1)
+# with one or two cores a worker process buys no parallelism, only the cost of pickling every page across,
+# so pages are parsed on a thread of this process instead
+USE_PROCESS_POOL = (os.cpu_count() or 1) > 2
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn rather than fork: the parent already runs Streamlit's and the http client's threads
+            _pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+async def parse_in_pool(parse, html):
+    # only the compact records extracted by parse come back from the worker
+    if not html:
+        return parse(html)
+    if not USE_PROCESS_POOL:
+        return await asyncio.to_thread(parse, html)
+    pool = get_pool()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, parse, html)
+    except BrokenProcessPool:
+        # a worker died (killed, out of memory), which breaks the whole executor for good;
+        # the next page starts a fresh pool and this one is parsed here
+        discard_pool(pool)
+        return parse(html)
@@ -0,0 +1,25 @@
+import re
+
+rating_conversion = {
+    "½": 1,
+    "★": 2,
+    "★½": 3,
+    "★★": 4,
+    "★★½": 5,
+    "★★★": 6,
+    "★★★½": 7,
+    "★★★★": 8,
+    "★★★★½": 9,
+    "★★★★★": 10
+}
+
+def parse_rating(rating_element):
+    for css_class in rating_element.get("class", []):
+        match = re.fullmatch(r"rated-(\d+)", css_class)
+        if match and 1 <= int(match.group(1)) <= 10:
+            return int(match.group(1))
+
+    rating_text = re.sub(r'\s+', '', rating_element.text)
+    if not rating_text:
+        return None
+    return rating_conversion.get(rating_text, "")
@@ -0,0 +1,53 @@
+import asyncio
+from parsing_scripts.http_client import fetch_page_until
+from parsing_scripts.parse_pool import parse_in_pool
+
+class SingleFlightFetcher:
+    # run-scoped: one download and one parse per URL, shared by every caller.
+    # With find_end the download stops as soon as everything parse reads has arrived.
+    def __init__(self, parse, find_end=None):
+        self.parse = parse
+        self.find_end = find_end
+        self.stopped_early = 0
+        self.results = {}
+        self.requests_made = 0
+        self.requests_saved = 0
+        self.failed = set()
+        self.retried = set()
+
+    async def get(self, url):
+        if url in self.results:
+            self.requests_saved += 1
+        else:
+            self.results[url] = asyncio.ensure_future(self.fetch_and_parse(url))
+        return await asyncio.shield(self.results[url])
+
+    async def fetch_and_parse(self, url):
+        self.requests_made += 1
+        status, html, stopped_early = await fetch_page_until(url, self.find_end)
+        # a 404 is a real answer; anything else without a page is worth another try later in the run
+        if html is None and status != 404:
+            self.failed.add(url)
+        if stopped_early:
+            self.stopped_early += 1
+        return await parse_in_pool(self.parse, html)
+
+    def needs_retry(self, url):
+        return url in self.failed or url in self.retried
+
+    async def retry(self, url):
+        # every caller holding a failed url shares a single second attempt
+        if url not in self.retried:
+            self.retried.add(url)
+            self.failed.discard(url)
+            self.results.pop(url, None)
+        return await self.get(url)
+
+    def stats(self):
+        return {
+            "requests_made": self.requests_made,
+            "requests_saved": self.requests_saved,
+            "requests_retried": len(self.retried),
+            "failed": len(self.failed),
+            "stopped_early": self.stopped_early,
+        }
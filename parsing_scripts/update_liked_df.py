@@ -1,110 +1,110 @@
-import requests
 from bs4 import BeautifulSoup
-import multiprocessing
 import pandas as pd
+from parsing_scripts.concurrency import PAGE_FETCHERS, for_each_bounded
+from parsing_scripts.http_client import fetch_page
+from parsing_scripts.user_snapshot import entries_hash
 
-def process_liked_page(username, page_number):
-    new_rows = []
+def parse_liked_page(html):
+    entries = []
+    soup = BeautifulSoup(html, "lxml")
+    film_posters = soup.find_all("div", class_="film-poster")
+    for poster in film_posters:
+        film_slug = poster.get("data-film-slug", None)
+        img = poster.find("img")
+        if film_slug and img and img.has_attr("alt"):
+            title = img["alt"].strip()
+            new_row = {
+                "title": title,
+                "watched_date": pd.NA,
+                "release_year": pd.NA,
+                "title_slug": film_slug,
+                "url": pd.NA,
+                "genres": pd.NA,
+                "director": pd.NA,
+                "cast": pd.NA,
+                "countries": pd.NA,
+                "studios": pd.NA,
+                "primary_language": pd.NA,
+                "spoken_languages": pd.NA,
+                "runtime": pd.NA,
+                "rating": pd.NA,
+                "liked": True
+            }
+            entries.append(new_row)
+
+    last_page = 1
+    finding_last_page = soup.find_all("li", class_="paginate-page")
+    if finding_last_page:
+        last_page = int(finding_last_page[-1].find("a").text.strip())
+
+    return entries, last_page
+
+async def fetch_liked_page(username, page_number):
     if page_number == 1:
         url = f"https://letterboxd.com/{username}/likes/films/"
     else:
         url = f"https://letterboxd.com/{username}/likes/films/page/{page_number}/"
 
-    response = requests.get(url)
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.text, "lxml")
-        film_posters = soup.find_all("div", class_="film-poster")
-        
-        for poster in film_posters:
-            film_slug = poster.get("data-film-slug", None)
-            img = poster.find("img")
-            
-            if film_slug and img and img.has_attr("alt"):
-                title = img["alt"].strip()
-                new_row = {
-                    "title": title,
-                    "watched_date": pd.NA,
-                    "release_year": pd.NA,
-                    "title_slug": film_slug,
-                    "url": pd.NA,
-                    "genres": pd.NA,
-                    "director": pd.NA,
-                    "cast": pd.NA,
-                    "countries": pd.NA,
-                    "studios": pd.NA,
-                    "primary_language": pd.NA,
-                    "spoken_languages": pd.NA,
-                    "runtime": pd.NA,
-                    "rating": pd.NA,
-                    "liked": True
-                }
-                new_rows.append(new_row)
-    return new_rows
+    status, html = await fetch_page(url)
+    if status != 200:
+        return None, None
+    return parse_liked_page(html)
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
+async def update_liked_movies_with_slugs(username, page_queue):
+    page_hash = None
+    failed_pages = []
 
-def fetch_pages_in_batch(username, start_page, end_page):
-    session = requests.Session()
-    entries = []
-    for page_number in range(start_page, end_page + 1):
-        url = f"https://letterboxd.com/{username}/likes/films/page/{page_number}/"
-        response = session.get(url)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, "lxml")
-            film_posters = soup.find_all("div", class_="film-poster")
-            if not film_posters:
-                return entries, False
+    async def queue_page(page_number):
+        entries, _ = await fetch_liked_page(username, page_number)
+        if entries is None:
+            failed_pages.append(page_number)
+        elif entries:
+            await page_queue.put(entries)
+
+    try:
+        # page 1 carries the pagination, so every other page is known upfront; a few fetchers work through them
+        entries, last_page = await fetch_liked_page(username, 1)
+        if entries is None:
+            return None, [1]
+        page_hash = entries_hash(entries)
+        if entries:
+            await page_queue.put(entries)
+        await for_each_bounded(range(2, last_page + 1), queue_page, workers=PAGE_FETCHERS)
+
+        # pages that failed even after fetch_page's retries get one more pass once the rest are in
+        retry_pages, failed_pages = failed_pages, []
+        await for_each_bounded(retry_pages, queue_page, workers=PAGE_FETCHERS)
+    finally:
+        await page_queue.put(None)
+    return page_hash, failed_pages
 
-            for poster in film_posters:
-                film_slug = poster.get("data-film-slug", None)
-                img = poster.find("img")
-                if film_slug and img and img.has_attr("alt"):
-                    title = img["alt"].strip()
-                    new_row = {
-                        "title": title,
-                        "watched_date": pd.NA,
-                        "release_year": pd.NA,
-                        "title_slug": film_slug,
-                        "url": pd.NA,
-                        "genres": pd.NA,
-                        "director": pd.NA,
-                        "cast": pd.NA,
-                        "countries": pd.NA,
-                        "studios": pd.NA,
-                        "primary_language": pd.NA,
-                        "spoken_languages": pd.NA,
-                        "runtime": pd.NA,
-                        "rating": pd.NA,
-                        "liked": True
-                    }
-                    entries.append(new_row)
-        else:
-            return entries, False
-    return entries, True
+async def update_new_liked_movies(username, page_queue, snapshot):
+    known_slugs = set(snapshot["liked_df"].get("title_slug", []))
+    page_hash = snapshot["liked_page_hash"]
+    failed_pages = []
 
-def update_liked_movies_with_slugs(username, liked_df):
-    batch_size = 10  
-    new_rows = []
-    batch_start = 1
-    more_data = True
+    try:
+        page_number = 1
+        last_page = 1
+        while page_number <= last_page:
+            entries, page_last_page = await fetch_liked_page(username, page_number)
+            if entries is None:
+                failed_pages.append(page_number)
+                break
+            if page_number == 1:
+                last_page = page_last_page
+                page_hash = entries_hash(entries)
+                if page_hash == snapshot["liked_page_hash"]:
+                    break
 
-    while more_data:
-        workers = multiprocessing.cpu_count() * 5
-        with ThreadPoolExecutor(max_workers=workers) as executor:
-            futures = []
-            for start_page in range(batch_start, batch_start + batch_size):
-                futures.append(executor.submit(fetch_pages_in_batch, username, start_page, start_page))
-            
-            more_data = False 
-            for future in as_completed(futures):
-                entries, has_more_data = future.result()
-                new_rows.extend(entries)
-                if has_more_data:
-                    more_data = True 
-            
-            batch_start += batch_size  
-    
-    if new_rows:
-        liked_df = pd.concat([liked_df, pd.DataFrame(new_rows)], ignore_index=True)
+            new_rows = [row for row in entries if row["title_slug"] not in known_slugs]
+            if new_rows:
+                await page_queue.put(new_rows)
 
-    return liked_df
\ No newline at end of file
+            # likes are listed newest first as well
+            if not entries or len(new_rows) < len(entries):
+                break
+            page_number += 1
+    finally:
+        await page_queue.put(None)
+    return page_hash, failed_pages
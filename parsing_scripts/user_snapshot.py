@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import json
+import time
+from contextlib import closing
+import pandas as pd
+from parsing_scripts.concurrency import for_each_bounded
+from parsing_scripts.diary_movie_info import apply_film, retry_failed_films
+from parsing_scripts.film_cache import SCHEMA_VERSION, connect, load_cached_films, store_films
+from parsing_scripts.film_page import film_url
+
+# incremental refreshes can't see deleted entries, unlikes, backdated logs or edits further back than the
+# pages they walk, so after this long the whole history is scraped again
+SNAPSHOT_MAX_AGE_SECONDS = 60 * 60 * 24 * 7
+
+def entries_hash(entries):
+    # hashes the parsed rows rather than the raw html, which changes on every load (csrf tokens, ads)
+    payload = json.dumps(entries, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def diary_entry_key(entry):
+    # the viewing url is per diary entry, so two films sharing a title or a same-day rewatch stay apart
+    return entry.get("title_slug"), entry.get("url")
+
+def parse_watched_date(watched_date):
+    return pd.to_datetime(watched_date, format="%d %b %Y", errors="coerce")
+
+def newest_watched_date(diary_df):
+    if diary_df.empty or "watched_date" not in diary_df:
+        return None
+    newest = parse_watched_date(diary_df["watched_date"]).max()
+    return None if pd.isna(newest) else newest.strftime("%Y-%m-%d")
+
+def load_snapshot(username):
+    with closing(connect()) as connection:
+        row = connection.execute(
+            "SELECT saved_at, newest_watched_date, diary_page_hash, liked_page_hash, diary, liked FROM user_snapshots "
+            "WHERE username = ? AND schema_version = ? AND saved_at >= ?",
+            (username.lower(), SCHEMA_VERSION, time.time() - SNAPSHOT_MAX_AGE_SECONDS),
+        ).fetchone()
+    if row is None:
+        return None
+
+    saved_at, newest_date, diary_page_hash, liked_page_hash, diary, liked = row
+    return {
+        "saved_at": saved_at,
+        "newest_watched_date": pd.Timestamp(newest_date) if newest_date else None,
+        "diary_page_hash": diary_page_hash,
+        "liked_page_hash": liked_page_hash,
+        "diary_df": pd.DataFrame(json.loads(diary)),
+        "liked_df": pd.DataFrame(json.loads(liked)),
+    }
+
+def save_snapshot(username, diary_df, liked_df, diary_page_hash, liked_page_hash, saved_at=None):
+    # saved_at is when the history was last scraped in full; an incremental refresh passes its snapshot's
+    # time along so the snapshot still expires
+    with closing(connect()) as connection, connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO user_snapshots (username, schema_version, saved_at, newest_watched_date, diary_page_hash, liked_page_hash, diary, liked) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                username.lower(),
+                SCHEMA_VERSION,
+                saved_at or time.time(),
+                newest_watched_date(diary_df),
+                diary_page_hash,
+                liked_page_hash,
+                diary_df.to_json(orient="records"),
+                liked_df.to_json(orient="records"),
+            ),
+        )
+
+def apply_diary_updates(diary_df, known_entries):
+    # entries on the walked pages are already enriched, but their rating, like and rewatch may have been edited since
+    updates = {diary_entry_key(entry): entry for entry in known_entries}
+    if not updates or diary_df.empty:
+        return diary_df
+
+    diary_df = diary_df.copy()
+    for index, key in zip(diary_df.index, zip(diary_df["title_slug"], diary_df["url"])):
+        entry = updates.get(key)
+        if entry is not None:
+            for column in ("rating", "liked", "rewatch"):
+                diary_df.at[index, column] = entry.get(column, pd.NA)
+    return diary_df
+
+def prepend_rows(new_df, snapshot_df):
+    frames = [frame for frame in (new_df, snapshot_df) if not frame.empty]
+    if not frames:
+        return new_df
+    return pd.concat(frames, ignore_index=True)
+
+def extend_snapshot(snapshot, new_diary_df, new_liked_df, known_entries):
+    diary_df = prepend_rows(new_diary_df, apply_diary_updates(snapshot["diary_df"], known_entries))
+    liked_df = prepend_rows(new_liked_df, snapshot["liked_df"])
+    return diary_df, liked_df
+
+async def refresh_snapshot_films(snapshot, fetcher):
+    # the snapshot's copy of each film is only trusted as long as the film cache would keep it,
+    # so films that have expired from the cache are fetched again
+    diary_rows = snapshot["diary_df"].to_dict("records")
+    liked_rows = snapshot["liked_df"].to_dict("records")
+    title_slugs = {row.get("title_slug") for row in diary_rows + liked_rows}
+    films = await asyncio.to_thread(load_cached_films, title_slugs)
+    fetched_films = {}
+
+    async def fetch_film(title_slug):
+        film = await fetcher.get(film_url(title_slug))
+        if film:
+            fetched_films[title_slug] = film
+
+    await for_each_bounded([slug for slug in title_slugs if isinstance(slug, str) and slug not in films], fetch_film)
+    films.update(fetched_films)
+    for rows, apply in ((diary_rows, apply_film), (liked_rows, dict.update)):
+        for row in rows:
+            film = films.get(row.get("title_slug"))
+            if film:
+                apply(row, film)
+        await retry_failed_films(rows, fetched_films, fetcher, apply)
+    await asyncio.to_thread(store_films, fetched_films)
+
+    return {**snapshot, "diary_df": pd.DataFrame(diary_rows), "liked_df": pd.DataFrame(liked_rows)}
@@ -1,12 +1,39 @@
-import requests
+import threading
 import streamlit as st
+from cachetools import TLRUCache
+from parsing_scripts.dates_from_diary import diary_page_url
+from parsing_scripts.http_client import fetch_page, run
+
+VALID_USERNAME_TTL_SECONDS = 60 * 60 * 24
+INVALID_USERNAME_TTL_SECONDS = 60 * 5
+CHECKED_USERNAMES_MAX = 10_000
+
+def username_expiry(username, is_valid, now):
+    return now + (VALID_USERNAME_TTL_SECONDS if is_valid else INVALID_USERNAME_TTL_SECONDS)
+
+# username -> is_valid, shared by every session in the process; expired and least recently used names are evicted
+_checked_usernames = TLRUCache(maxsize=CHECKED_USERNAMES_MAX, ttu=username_expiry)
+_checked_usernames_lock = threading.Lock()
 
 def valid_letterboxd_username(username):
-    url = f"https://letterboxd.com/{username}/"
-    response = requests.get(url)
+    # returns the username (False if it doesn't exist) and diary page 1 when this call had to fetch it,
+    # so a scrape in the same run can start from that page instead of fetching it again
+    first_page = None
+    with _checked_usernames_lock:
+        is_valid = _checked_usernames.get(username.lower())
+    if is_valid is None:
+        # diary page 1 doubles as the existence check
+        status, html = run(fetch_page(diary_page_url(username, 1)))
+        is_valid = status == 200
+        if is_valid:
+            first_page = html
+        # a failed request says nothing about the username, so only real answers are remembered
+        if status in (200, 404):
+            with _checked_usernames_lock:
+                _checked_usernames[username.lower()] = is_valid
 
-    if response.status_code == 200:
-        return username
+    if is_valid:
+        return username, first_page
     else:
         st.error("Hmmmm couldn't find anything, are you sure the username is correct?")
-        return False
\ No newline at end of file
+        return False, None
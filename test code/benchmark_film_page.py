@@ -0,0 +1,130 @@
+import os
+import random
+import re
+import sys
+import timeit
+from bs4 import BeautifulSoup
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from parsing_scripts.film_page import parse_film_page
+
+# usage: python "test code/benchmark_film_page.py" [folder of saved film pages (*.html)]
+# without a folder it builds synthetic pages shaped like letterboxd.com/film/<slug>/
+
+def legacy_parse_film_page(html):
+    # the per-field find/find_all version this module replaced
+    film = {}
+    soup = BeautifulSoup(html, "lxml")
+    year_container = soup.find("small", class_="number")
+    if year_container and year_container.find("a"):
+        film["release_year"] = year_container.find("a").text
+
+    genre_main_container = soup.find("div", {"id": "tab-genres"})
+    if genre_main_container:
+        genre_container = genre_main_container.find("div", class_="text-sluglist")
+        if genre_container:
+            genres = genre_container.find_all("a", class_="text-slug")
+            if genres:
+                film["genres"] = ", ".join(genre.text for genre in genres)
+
+    cast_main_container = soup.find("div", class_="cast-list text-sluglist")
+    if cast_main_container:
+        cast = [a.text for a in cast_main_container.find_all("a", class_="text-slug")]
+        film["cast"] = ", ".join(cast)
+
+    director_main_container = soup.find("div", {"id": "tab-crew"})
+    if director_main_container:
+        director_container = director_main_container.find("div", class_="text-sluglist")
+        if director_container:
+            directors = director_container.find_all("a", class_="text-slug")
+            if directors:
+                film["director"] = ", ".join(director.text for director in directors)
+
+    country_containers = soup.find_all("a", class_="text-slug", href=lambda value: value and value.startswith("/films/country/"))
+    if country_containers:
+        film["countries"] = ", ".join(country.text for country in country_containers)
+
+    studios_container = soup.find_all("a", href=lambda value: value and value.startswith("/studio/"))
+    if studios_container:
+        film["studios"] = ", ".join(studios.text for studios in studios_container)
+
+    language_containers = soup.find_all("a", href=lambda value: value and value.startswith("/films/language/"))
+    if language_containers:
+        primary_language = language_containers[0].text
+        film["primary_language"] = primary_language
+        spoken_languages = [language.text for language in language_containers if language.text != primary_language]
+        film["spoken_languages"] = ", ".join(spoken_languages) if spoken_languages else pd.NA
+
+    runtime_container = soup.find("p", class_="text-footer")
+    if runtime_container:
+        match = re.search(r'(\d+,?)+', runtime_container.get_text())
+        if match:
+            film["runtime"] = int(match.group().replace(',', ''))
+
+    return film
+
+def slug_links(prefix, names):
+    return "".join(f'<a href="{prefix}{name.lower().replace(" ", "-")}/" class="text-slug tooltip">{name}</a> ' for name in names)
+
+def synthetic_film_page(index):
+    rng = random.Random(index)
+    people = [f"Person {rng.randrange(5000)}" for _ in range(40)]
+    directors = people[:rng.choice([1, 1, 2])]
+    genres = rng.sample(["Drama", "Comedy", "Horror", "Thriller", "Crime", "Romance", "Animation", "Documentary"], 2)
+    languages = rng.sample(["English", "French", "Korean", "Japanese", "German", "Spanish"], rng.choice([1, 1, 3]))
+    runtime = rng.choice(["95", "124", "1,440"])
+    navigation = "".join(f'<li><a href="/films/popular/this/week/page/{i}/">Link {i}</a></li>' for i in range(120))
+    reviews = "".join(
+        f'<li class="film-detail"><a class="avatar" href="/user{i}/"><img alt="user{i}"></a><div class="body-text"><p>{"Review text. " * 40}</p></div>'
+        f'<a href="/user{i}/film/slug-{index}/">Review</a></li>'
+        for i in range(12)
+    )
+    similar = "".join(f'<li class="poster-container"><div class="film-poster" data-film-slug="similar-{i}"><a href="/film/similar-{i}/"><img alt="Similar {i}"></a></div></li>' for i in range(12))
+    return f"""<!DOCTYPE html><html><head><title>Film {index}</title>{'<script>var x = 1;</script>' * 20}</head><body>
+<header><nav><ul>{navigation}</ul></nav></header>
+<section class="film-header-group"><h1 class="headline-1">Film {index}</h1>
+<small class="number"><a href="/films/year/{1950 + index % 70}/">{1950 + index % 70}</a></small>
+<p class="credits"><span class="introduction">Directed by</span> {"".join(f'<a class="contributor" href="/director/{d.lower().replace(" ", "-")}/"><span class="prettify">{d}</span></a>' for d in directors)}</p></section>
+<div id="tabbed-content">
+<div id="tab-cast"><div class="cast-list text-sluglist"><p>{slug_links("/actor/", people[2:22])}</p></div></div>
+<div id="tab-crew"><h3><span class="crewrole -full">Director</span></h3><div class="text-sluglist"><p>{slug_links("/director/", directors)}</p></div>
+<h3><span class="crewrole -full">Writer</span></h3><div class="text-sluglist"><p>{slug_links("/writer/", people[22:25])}</p></div>
+<h3><span class="crewrole -full">Producer</span></h3><div class="text-sluglist"><p>{slug_links("/producer/", people[25:32])}</p></div></div>
+<div id="tab-details"><h3><span>Studios</span></h3><div class="text-sluglist"><p>{slug_links("/studio/", [f"Studio {rng.randrange(300)}" for _ in range(rng.choice([1, 2, 3]))])}</p></div>
+<h3><span>Country</span></h3><div class="text-sluglist"><p>{slug_links("/films/country/", rng.sample(["USA", "UK", "France", "South Korea", "Japan"], rng.choice([1, 2])))}</p></div>
+<h3><span>Languages</span></h3><div class="text-sluglist"><p>{slug_links("/films/language/", languages)}</p></div></div>
+<div id="tab-genres"><h3><span>Genres</span></h3><div class="text-sluglist capitalize"><p>{slug_links("/films/genre/", genres)}</p></div>
+<h3><span>Themes</span></h3><div class="text-sluglist capitalize"><p>{slug_links("/films/theme/", ["Theme A", "Theme B", "Theme C"])}</p></div></div>
+</div>
+<p class="text-link text-footer">{runtime}&nbsp;mins &nbsp; More at <a href="http://www.imdb.com/title/tt{index}/" class="micro-button track-event">IMDb</a> <a href="https://www.themoviedb.org/movie/{index}/" class="micro-button track-event">TMDb</a></p>
+<section id="popular-reviews"><ul>{reviews}</ul></section>
+<section id="similar-films"><ul>{similar}</ul></section>
+<footer>{"<p>footer</p>" * 50}</footer></body></html>"""
+
+def load_pages():
+    if len(sys.argv) > 1:
+        folder = sys.argv[1]
+        names = sorted(name for name in os.listdir(folder) if name.endswith(".html"))
+        pages = []
+        for name in names:
+            with open(os.path.join(folder, name), encoding="utf-8") as page:
+                pages.append(page.read())
+        return pages
+    return [synthetic_film_page(index) for index in range(200)]
+
+def same_film(old, new):
+    # the legacy parser joined multi-valued fields into one string
+    new = {key: ", ".join(value) if isinstance(value, list) else value for key, value in new.items()}
+    keys = set(old) | set(new)
+    return all(pd.isna(old.get(key)) and pd.isna(new.get(key)) or old.get(key) == new.get(key) for key in keys)
+
+if __name__ == "__main__":
+    pages = load_pages()
+    mismatches = [index for index, page in enumerate(pages) if not same_film(legacy_parse_film_page(page), parse_film_page(page))]
+    print(f"{len(pages)} pages, {len(mismatches)} with different output {mismatches[:10]}")
+
+    legacy = min(timeit.repeat(lambda: [legacy_parse_film_page(page) for page in pages], number=1, repeat=3))
+    single_pass = min(timeit.repeat(lambda: [parse_film_page(page) for page in pages], number=1, repeat=3))
+    print(f"legacy:      {legacy * 1000 / len(pages):.2f} ms/page")
+    print(f"single pass: {single_pass * 1000 / len(pages):.2f} ms/page ({legacy / single_pass:.2f}x)")
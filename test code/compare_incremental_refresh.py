@@ -0,0 +1,95 @@
+import asyncio
+import os
+import sys
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import parsing_scripts.dates_from_diary as dates_from_diary
+from parsing_scripts.dates_from_diary import diary_page_url, grab_date_info, grab_new_date_info
+from parsing_scripts.user_snapshot import extend_snapshot, newest_watched_date
+
+# usage: python "test code/compare_incremental_refresh.py"
+# a refresh from a snapshot must end with the same diary as a full reload, including entries logged after
+# the snapshot on the same day as its newest one: a rewatch of that film and a different film sharing a title
+
+USERNAME = "user"
+PER_PAGE = 5
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+def diary_entry(index, title_slug, title, day, viewing=0):
+    return {
+        "title_slug": title_slug,
+        "title": title,
+        "viewing": f"/{USERNAME}/film/{title_slug}/" + (f"{viewing}/" if viewing else ""),
+        "day": day,
+        "month": MONTHS[index % 12],
+        "release_year": str(1950 + index),
+        "rewatch": viewing > 0,
+        "rating": 1 + (index + viewing) % 10,
+    }
+
+def diary_row(entry):
+    rewatch_class = "" if entry["rewatch"] else " icon-status-off"
+    return (
+        f'<tr class="diary-entry-row"><td class="td-calendar"><strong><a href="#">{entry["month"]}</a></strong><small>2024</small></td>'
+        f'<td class="td-day"><a href="#">{entry["day"]:02d}</a></td>'
+        f'<td class="td-film-details"><div class="film-poster" data-film-slug="{entry["title_slug"]}"></div>'
+        f'<h3 class="headline-3"><a href="{entry["viewing"]}">{entry["title"]}</a></h3></td>'
+        f'<td class="td-released"><span>{entry["release_year"]}</span></td>'
+        f'<td class="td-rating"><span class="rating rated-{entry["rating"]}"></span></td>'
+        f'<td class="td-like"></td><td class="td-rewatch{rewatch_class}"></td></tr>'
+    )
+
+def diary_pages(entries):
+    # newest first, PER_PAGE entries per page, every page listing the pagination
+    page_count = max(1, -(-len(entries) // PER_PAGE))
+    pagination = "".join(f'<li class="paginate-page"><a href="#">{number}</a></li>' for number in range(1, page_count + 1))
+    return {
+        diary_page_url(USERNAME, number): "<table>" + "".join(diary_row(entry) for entry in entries[(number - 1) * PER_PAGE:number * PER_PAGE]) + f"</table><ul>{pagination}</ul>"
+        for number in range(1, page_count + 1)
+    }
+
+def serve(pages):
+    async def fetch_page(url, find_end=None):
+        return (200, pages[url]) if url in pages else (404, None)
+    dates_from_diary.fetch_page = fetch_page
+
+async def collect(producer, page_queue):
+    rows = []
+    async def drain():
+        while (entries := await page_queue.get()) is not None:
+            rows.extend(entries)
+    result, _ = await asyncio.gather(producer, drain())
+    return result, rows
+
+def full_scrape():
+    page_queue = asyncio.Queue(maxsize=4)
+    (page_hash, _, _), rows = asyncio.run(collect(grab_date_info(USERNAME, page_queue), page_queue))
+    return page_hash, pd.DataFrame(rows)
+
+def comparable(diary_df):
+    columns = sorted(diary_df.columns)
+    return diary_df[columns].astype(str).sort_values(["title_slug", "url"]).reset_index(drop=True)
+
+if __name__ == "__main__":
+    # month index 0 is the newest, so every older entry gets an older month
+    history = [diary_entry(index, f"film-{index}", f"Film {index}", 10) for index in range(12)]
+    history[0] = diary_entry(0, "same-title-1950", "Same Title", 10)
+    serve(diary_pages(history))
+    page_hash, diary_df = full_scrape()
+    newest = newest_watched_date(diary_df)
+    snapshot = {"diary_df": diary_df, "liked_df": pd.DataFrame(), "newest_watched_date": pd.Timestamp(newest) if newest else None, "diary_page_hash": page_hash}
+
+    logged_since = [
+        diary_entry(0, "same-title-1950", "Same Title", 10, viewing=1),
+        diary_entry(0, "same-title-2001", "Same Title", 10),
+        diary_entry(0, "same-title-1950", "Same Title", 10, viewing=2),
+    ]
+    serve(diary_pages(logged_since + history))
+    page_queue = asyncio.Queue(maxsize=4)
+    (_, known_entries, failed_pages), new_rows = asyncio.run(collect(grab_new_date_info(USERNAME, page_queue, snapshot), page_queue))
+    refreshed_df, _ = extend_snapshot(snapshot, pd.DataFrame(new_rows), pd.DataFrame(), known_entries)
+    _, reloaded_df = full_scrape()
+
+    same = comparable(refreshed_df).equals(comparable(reloaded_df))
+    print(f"refresh: {len(new_rows)} new of {len(refreshed_df)} entries, full reload: {len(reloaded_df)} entries, identical: {same}, failed pages: {failed_pages}")
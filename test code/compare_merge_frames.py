@@ -0,0 +1,96 @@
+import os
+import random
+import sys
+import timeit
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from parsing_scripts.merge_frames import merge_diary_and_likes
+
+# usage: python "test code/compare_merge_frames.py"
+# on films with unique titles merge_diary_and_likes must give the same frame as the title-keyed outer merge
+# it replaced; then both are timed on a 10k-entry diary and 10k likes
+
+MERGE_COLUMNS = ['title', 'watched_date', 'release_year', 'title_slug', 'url', 'genres', 'director', 'cast', 'countries', 'studios', 'primary_language', 'spoken_languages', 'runtime', 'rating']
+
+def legacy_merge(updated_diary_df, updated_liked_df):
+    # what run_asyncio_tasks used to do, on the comma-joined metadata strings it was written for
+    updated_diary_df = updated_diary_df.copy()
+    updated_liked_df = updated_liked_df.copy()
+    updated_liked_df.replace("", pd.NA, inplace=True)
+    liked_titles_set = set(updated_liked_df['title'])
+    diary_liked = updated_diary_df['title'].apply(lambda title: title in liked_titles_set)
+    if 'liked' in updated_diary_df:
+        diary_liked = diary_liked | updated_diary_df['liked'].fillna(False).astype(bool)
+    updated_diary_df['liked'] = diary_liked
+    final_df = pd.merge(updated_diary_df, updated_liked_df, on=MERGE_COLUMNS, how='outer', suffixes=('', '_liked'))
+    final_df['liked'] = final_df.apply(lambda row: True if pd.notna(row.get('liked_liked')) else row['liked'], axis=1)
+    final_df.drop(columns=['liked_liked'], inplace=True)
+    duplicate_marker = final_df.duplicated(subset=[
+        "title", "release_year", "genres", "director", "cast",
+        "countries", "studios", "primary_language", "spoken_languages",
+        "runtime", "liked"
+    ], keep=False)
+    final_df.drop_duplicates(subset=MERGE_COLUMNS + ['liked'], inplace=True)
+    duplicate_marker = duplicate_marker & final_df['watched_date'].isna()
+    return final_df[~duplicate_marker]
+
+def synthetic_film(rng, index):
+    people = [f"Person {rng.randrange(5000)}" for _ in range(24)]
+    languages = rng.sample(["English", "French", "Korean", "Japanese", "German", "Spanish"], rng.choice([1, 1, 3]))
+    return {
+        "title": f"Film {index}",
+        "title_slug": f"film-{index}",
+        "release_year": str(1950 + index % 70),
+        "genres": ", ".join(rng.sample(["Drama", "Comedy", "Horror", "Thriller", "Crime", "Romance"], 2)),
+        "director": people[0],
+        "cast": ", ".join(people[1:]),
+        "countries": rng.choice(["USA", "UK", "France", "South Korea", "Japan"]),
+        "studios": f"Studio {rng.randrange(300)}",
+        "primary_language": languages[0],
+        "spoken_languages": ", ".join(languages[1:]) or pd.NA,
+        "runtime": rng.randrange(80, 180),
+    }
+
+def fixture_frames(diary_entries, liked_films, seed=0):
+    # a diary with rewatches, entries liked in the diary itself and exact duplicate rows, and likes
+    # that are partly logged films and partly films only ever liked
+    rng = random.Random(seed)
+    films = [synthetic_film(rng, index) for index in range(diary_entries + liked_films)]
+    logged_films = films[:int(diary_entries * 0.7)]
+
+    diary_rows = []
+    for entry in range(diary_entries):
+        film = rng.choice(logged_films)
+        diary_rows.append({
+            **film,
+            "url": f"https://letterboxd.com/user/film/{film['title_slug']}/{entry}/",
+            "watched_date": f"{rng.randrange(1, 29)} Jan {rng.randrange(2015, 2025)}",
+            "rating": rng.choice([float("nan"), 2.0, 3.5, 4.0, 5.0]),
+            "liked": rng.random() < 0.05,
+            "rewatch": rng.random() < 0.1,
+        })
+    diary_rows += rng.sample(diary_rows, diary_entries // 100)
+
+    liked_rows = []
+    liked_pool = rng.sample(logged_films, min(len(logged_films), liked_films // 2)) + films[len(logged_films):]
+    for film in liked_pool[:liked_films]:
+        liked_rows.append({**film, "watched_date": None, "url": None, "rating": rng.choice([float("nan"), 3.0, 4.5]), "liked": True})
+    return pd.DataFrame(diary_rows), pd.DataFrame(liked_rows)
+
+def comparable(frame):
+    # row order and missing-value flavours differ between the two merges, the content must not
+    frame = frame.astype(str).replace({"<NA>": "nan", "None": "nan"})
+    frame = frame[sorted(frame.columns)]
+    return frame.sort_values(list(frame.columns)).reset_index(drop=True)
+
+if __name__ == "__main__":
+    for diary_entries, liked_films in ((200, 120), (2000, 800)):
+        diary_df, liked_df = fixture_frames(diary_entries, liked_films)
+        legacy, merged = comparable(legacy_merge(diary_df, liked_df)), comparable(merge_diary_and_likes(diary_df, liked_df))
+        print(f"{diary_entries} diary + {liked_films} liked: {len(legacy)} vs {len(merged)} rows, identical: {legacy.equals(merged)}")
+
+    diary_df, liked_df = fixture_frames(10_000, 10_000)
+    legacy = min(timeit.repeat(lambda: legacy_merge(diary_df, liked_df), number=1, repeat=3))
+    keyed = min(timeit.repeat(lambda: merge_diary_and_likes(diary_df, liked_df), number=1, repeat=3))
+    print(f"10k diary + 10k liked: legacy {legacy * 1000:.0f} ms, title_slug merge {keyed * 1000:.0f} ms ({legacy / keyed:.1f}x)")
@@ -0,0 +1,18 @@
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from parsing_scripts.film_page import BACKENDS
+from benchmark_film_page import load_pages
+
+# usage: python "test code/compare_parser_backends.py" [folder of saved film pages (*.html)]
+# every backend must give the same FilmDetails as the BeautifulSoup reference on every page
+
+if __name__ == "__main__":
+    pages = load_pages()
+    reference = [BACKENDS["soup"](page) for page in pages]
+    for name, extract in BACKENDS.items():
+        mismatches = [index for index, page in enumerate(pages) if extract(page) != reference[index]]
+        seconds = min(timeit.repeat(lambda: [extract(page) for page in pages], number=1, repeat=3))
+        print(f"{name:>5}: {seconds * 1000 / len(pages):.2f} ms/page, {len(mismatches)} of {len(pages)} pages differ from soup {mismatches[:10]}")
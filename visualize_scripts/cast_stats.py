@@ -6,20 +6,12 @@ import matplotlib.pyplot as plt
 from itertools import combinations
 from community import community_louvain
 import numpy as np
+from parsing_scripts.film_model import event_films, film_names
+from visualize_scripts.facet_summary import concise_hover_text, facet_summary
+from visualize_scripts.stats_cache import cached_stats
 
 def create_bar_graph(data, x, y, title, color="skyblue", hover_data=None, ccs=None):
-    def concise_hover_text(movies_list):
-        if len(movies_list) <= 5:
-            return "<br>".join(movies_list)
-        else:
-            more_count = len(movies_list) - 5
-            displayed_movies = movies_list[:5]
-            return "<br>".join(displayed_movies) + f"<br>and {more_count} more..."
-
-    if hover_data is not None:
-        data["hover_text"] = hover_data.apply(concise_hover_text)
-    else:
-        data["hover_text"] = ""
+    data = data.assign(hover_text=hover_data if hover_data is not None else "")
 
     fig = px.bar(
         data, y=y, x=x, orientation="h",
@@ -71,7 +63,7 @@ def build_actor_network(final_df):
     G = nx.Graph()
 
     for index, row in final_df.iterrows():
-        actors = row['cast'].split(', ')
+        actors = row['cast']
         for actor_pair in combinations(actors, 2):
             if G.has_edge(*actor_pair):
                 G[actor_pair[0]][actor_pair[1]]['weight'] += 1
@@ -95,19 +87,20 @@ def adjust_positions(pos, G, min_distance=0.1):
     adjusted_pos = {node: pos + adjustment for (node, pos), adjustment in zip(pos.items(), adjustments)}
     return adjusted_pos
 
-def visualize_network(G):
+def network_layout(G):
     partition = community_louvain.best_partition(G)
     community_colors = {node: partition[node] for node in G.nodes()}
-    
+    pos = nx.spring_layout(G, k=0.6, iterations=50)
+    adjusted_pos = iterative_adjust_positions(pos, min_distance=0.3, max_iterations=100)
+    return community_colors, adjusted_pos
+
+def visualize_network(G, community_colors, adjusted_pos):
     colors = [
         '#b9d9dc', '#a8dadc', '#95d0d3', '#82c5ca', '#6fbac1',
         '#9de2d0', '#b5e4ca', '#cce7c4', '#d7e8bc',
         '#f1d1a9', '#f4b880', '#f79e6d', '#ffb35c', '#ffbf70', '#ffcb85'
     ]
     custom_cmap = LinearSegmentedColormap.from_list("custom_expanded", colors, N=256)
-    
-    pos = nx.spring_layout(G, k=0.6, iterations=50)
-    adjusted_pos = iterative_adjust_positions(pos, min_distance=0.3, max_iterations=100)
 
     fig, ax = plt.subplots(figsize=(8, 8))
     fig.set_facecolor("#0F1116")
@@ -120,31 +113,29 @@ def visualize_network(G):
     plt.axis('off')
     st.pyplot(plt.gcf())
 
-def cast_stats(final_df):
-    with st.expander("Cast Stats"):
-        cast_df = final_df.copy()
-        cast_df["cast"] = cast_df["cast"].str.split(", ")
-        cast_df = cast_df.explode("cast")
-        cast_df = cast_df[~cast_df["cast"].str.contains(r"^Jr\.$", case=False, na=False)]
-        cast_df = cast_df[~cast_df["cast"].str.contains("show", case=False, na=False)]
-        cast_movies = cast_df.groupby("cast")["title"].apply(list).reset_index(name="Movies")
-
-        cast_count = cast_df["cast"].value_counts().reset_index()
-        cast_count.columns = ["Cast", "Count"]
-        cast_count = cast_count.merge(cast_movies, left_on="Cast", right_on="cast", how="left").drop(columns = ["cast"])
-
-        top_10_common_actors = cast_count.head(10).sort_values(by="Count", ascending=True)
-
-        liked_movies_df = cast_df[cast_df["liked"] == True].copy()
-        liked_movies_df["cast"] = liked_movies_df["cast"].str.split(", ")
-        liked_movies_df = liked_movies_df.explode("cast")
-        liked_movies_df = liked_movies_df[~liked_movies_df["cast"].str.contains("show", case=False, na=False)]
-        liked_movies_df = liked_movies_df[~liked_movies_df["cast"].str.contains(r'^Jr\.$', case=False, na=False)]
-        liked_high_rated_actors = liked_movies_df.groupby("cast")["title"].apply(list).reset_index(name="Movies")
-        high_rated_actors_counted = liked_movies_df["cast"].value_counts().reset_index()
-        high_rated_actors_counted.columns = ["Cast", "Count"]
-        high_rated_actors_counted = high_rated_actors_counted.merge(liked_high_rated_actors, left_on="Cast", right_on="cast", how="left").drop(columns=["cast"])
-        top_actors_high_rated = high_rated_actors_counted.head(10).sort_values(by="Count", ascending=True)
+@cached_stats
+def cast_stats_data(fingerprint, _model):
+    cast_count = facet_summary(_model, "cast").rename(columns={"cast": "Cast", "count": "Count", "titles": "Movies"})
+
+    top_10_common_actors = cast_count.head(10).sort_values(by="Count", ascending=True)
+
+    high_rated_actors_counted = facet_summary(_model, "cast", liked_only=True).rename(columns={"cast": "Cast", "count": "Count", "titles": "Movies"})
+    top_actors_high_rated = high_rated_actors_counted.head(10).sort_values(by="Count", ascending=True)
+
+    watched_df = event_films(_model)
+    watched_df['cast'] = watched_df['film_id'].map(film_names(_model, "cast"))
+    top_rated_df = watched_df.dropna(subset=['cast']).sort_values(by='rating', ascending=False, kind='stable').head(10)
+    top_rated_df = top_rated_df.assign(cast=top_rated_df['cast'].str[:5])
+    grab_connections = build_actor_network(top_rated_df)
+    community_colors, adjusted_pos = network_layout(grab_connections)
+    return top_10_common_actors, top_actors_high_rated, grab_connections, community_colors, adjusted_pos
+
+@st.fragment
+def cast_stats(model):
+    with st.expander("Cast Stats", key="cast_stats_panel", on_change="rerun") as panel:
+        if not panel.open:
+            return
+        top_10_common_actors, top_actors_high_rated, grab_connections, community_colors, adjusted_pos = cast_stats_data(model.fingerprint, model)
 
         st.markdown("""
             <style>
@@ -158,7 +149,7 @@ def cast_stats(final_df):
             </style>
             <p class="big-font">Most watched actors:</p>
             """, unsafe_allow_html=True)
-        fig1 = create_bar_graph(top_10_common_actors, x="Count", y="Cast", title="Most Watched Actors", color="rgb(102, 221, 103)", hover_data=top_10_common_actors["Movies"])
+        fig1 = create_bar_graph(top_10_common_actors, x="Count", y="Cast", title="Most Watched Actors", color="rgb(102, 221, 103)", hover_data=concise_hover_text(top_10_common_actors["Movies"], top_10_common_actors["Count"]))
         st.plotly_chart(fig1, use_container_width=True, config={"displayModeBar": False})
 
         st.markdown("""
@@ -173,7 +164,7 @@ def cast_stats(final_df):
             </style>
             <p class="big-font">Top actors from your liked movies:</p>
             """, unsafe_allow_html=True)
-        fig3 = create_bar_graph(top_actors_high_rated, x="Count", y="Cast", title="Common Actors from Movies you've Liked", color="rgb(239, 135, 51)",  hover_data=top_actors_high_rated["Movies"])
+        fig3 = create_bar_graph(top_actors_high_rated, x="Count", y="Cast", title="Common Actors from Movies you've Liked", color="rgb(239, 135, 51)",  hover_data=concise_hover_text(top_actors_high_rated["Movies"], top_actors_high_rated["Count"]))
         st.plotly_chart(fig3, use_container_width=True, config={"displayModeBar": False})
 
         st.markdown("""
@@ -200,8 +191,5 @@ def cast_stats(final_df):
             </style>
             <p class="speciall-font">(Shows actors that have acted together in your top 10 rated movies. Bigger node size = more connections)</p>
             """, unsafe_allow_html=True)
-        top_rated_df = final_df.sort_values(by='rating', ascending=False).head(10)
-        top_rated_df['cast'] = top_rated_df['cast'].apply(lambda x: ', '.join(x.split(', ')[:5]))
-        grab_connections = build_actor_network(top_rated_df)
-        visualize_network(grab_connections)
+        visualize_network(grab_connections, community_colors, adjusted_pos)
 
@@ -2,6 +2,8 @@ import streamlit as st
 import plotly.express as px
 import pycountry
 import pandas as pd
+from visualize_scripts.facet_summary import concise_hover_text, facet_rows, facet_summary, first_titles, mean_rating_table
+from visualize_scripts.stats_cache import cached_stats
 
 def get_iso_alpha_3(country_name):
     special_cases = {
@@ -22,35 +24,24 @@ def get_iso_alpha_3(country_name):
         # print(f"Country not found: {country_name}")
         return None
 
-def prepare_world_map(final_df):
-    final_df["countries"] = final_df["countries"].str.split(", ")
-    final_df = final_df.explode("countries")
-    final_df = final_df[~final_df["countries"].str.contains("show", case=False, na=False)]
-    final_df["iso_alpha"] = final_df["countries"].apply(get_iso_alpha_3)
-    country_movies = final_df.groupby("iso_alpha")["title"].apply(list).reset_index(name="Movies")
+def prepare_world_map(model):
+    # looked up once per country rather than once per watch; countries without a code are left off the map
+    iso_ids, iso_codes = pd.factorize(pd.Series([get_iso_alpha_3(country) for country in model.entities["countries"]], dtype=object))
+    row_events, row_entities = facet_rows(model, "countries", model.events)
+    row_isos = iso_ids[row_entities]
+    on_map = row_isos >= 0
+    titles = model.films["title"].to_numpy()[model.events["film_id"].to_numpy()[row_events[on_map]]]
+    movies, watched = first_titles(row_isos[on_map], titles, len(iso_codes))
 
-    country_counts = final_df["iso_alpha"].value_counts().reset_index()
-    country_counts.columns = ["iso_alpha", "movies_watched"]
-    country_counts = country_counts.merge(country_movies, on="iso_alpha", how="left")
+    country_counts = pd.DataFrame({"iso_alpha": iso_codes, "movies_watched": watched, "Movies": movies})
+    country_counts = country_counts[country_counts["movies_watched"] > 0].sort_values("movies_watched", ascending=False, kind="stable").reset_index(drop=True)
 
     country_counts["country_name"] = country_counts["iso_alpha"].apply(lambda x: pycountry.countries.get(alpha_3=x).name if x else "Unknown")
 
     return country_counts
 
 def create_bar_graph(data, x, y, title, color="skyblue", hover_data=None, ccs=None):
-    def concise_hover_text(movies_list):
-        if len(movies_list) <= 5:
-            return "<br>".join(movies_list)
-        else:
-            more_count = len(movies_list) - 5
-            displayed_movies = movies_list[:5]
-            return "<br>".join(displayed_movies) + f"<br>and {more_count} more..."
-
-    if hover_data is not None:
-        data = data.copy()
-        data["hover_text"] = hover_data.apply(concise_hover_text)
-    else:
-        data["hover_text"] = ""
+    data = data.assign(hover_text=hover_data if hover_data is not None else "")
 
     fig = px.bar(
         data, y=y, x=x, orientation="h",
@@ -80,29 +71,13 @@ def create_bar_graph(data, x, y, title, color="skyblue", hover_data=None, ccs=No
     return fig
 
 def plot_world_map(data, hover_data=None):
-    def concise_hover_text(movies_list):
-        if len(movies_list) <= 5:
-            return "<br>".join(movies_list)
-        else:
-            more_count = len(movies_list) - 5
-            displayed_movies = movies_list[:5]
-            return "<br>".join(displayed_movies) + f"<br>and {more_count} more..."
-
-    if hover_data is not None:
-        data = data.copy()
-        data["hover_text"] = hover_data.apply(concise_hover_text)
-    else:
-        data["hover_text"] = ""
+    data = data.assign(hover_text=hover_data if hover_data is not None else "")
 
     colour_scale = [
         [0, "rgb(255, 224, 189)"],
         [1, "rgb(255, 140, 0)"]
     ]
 
-    data["Movies"] = data["Movies"].apply(lambda x: [str(i) for i in x])
-
-    data["hover_text"] = data["Movies"].apply(concise_hover_text)
-
     fig = px.choropleth(
         data_frame=data,
         locations="iso_alpha",
@@ -133,21 +108,8 @@ def plot_world_map(data, hover_data=None):
     
     st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
 
-def countries_with_rating(final_df):
-    final_df["countries"] = final_df["countries"].apply(lambda x: [countries.strip().lower() for countries in x.split(",")] if isinstance(x, str) else x)
-    df_exploded = final_df.explode("countries")
-    df_exploded = df_exploded[~df_exploded["countries"].str.contains("show", case=False, na=False)]
-
-    countries_counts = df_exploded["countries"].value_counts().reset_index(name="count").rename(columns={"index": "countries"})
-    top20_countriess = countries_counts.nlargest(20, "count")
-    df_exploded = df_exploded.merge(top20_countriess[["countries"]], on="countries")
-
-    df_exploded["rating"] = pd.to_numeric(df_exploded["rating"], errors="coerce")
-    avg_rating_by_countries = df_exploded.groupby("countries")["rating"].mean().reset_index(name="mean_rating")
-    avg_rating_by_countries["mean_rating"] = avg_rating_by_countries["mean_rating"].round(1)
-    avg_rating_by_countries["countries"] = avg_rating_by_countries["countries"].str.capitalize()
-    
-    return avg_rating_by_countries
+def countries_with_rating(countries_summary):
+    return mean_rating_table(countries_summary.nlargest(20, "count"), "countries")
 
 def create_avg_rating_by_countries_graph_horizontal(avg_rating_by_countries):
     # avg_rating_by_countries = avg_rating_by_countries.sort_values("mean_rating", ascending=True)
@@ -182,9 +144,26 @@ def create_avg_rating_by_countries_graph_horizontal(avg_rating_by_countries):
 
     st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
 
-def countries_stats(final_df):
-    with st.expander("Countries Stats"):
-        countries_df = final_df.copy()
+@cached_stats
+def countries_stats_data(fingerprint, _model):
+    world_map = prepare_world_map(_model)
+
+    countries_summary = facet_summary(_model, "countries")
+    countries_count = countries_summary.rename(columns={"countries": "Countries", "count": "Count", "titles": "Movies"})
+    top_10_common_countries = countries_count.head(10).sort_values(by="Count", ascending=True)
+
+    countries_counted = facet_summary(_model, "countries", liked_only=True).rename(columns={"countries": "Countries", "count": "Count", "titles": "Movies"})
+    top_countries_high_rated = countries_counted.head(10).sort_values(by="Count", ascending=True)
+
+    avg_rating_by_countries = countries_with_rating(countries_summary)
+    return world_map, top_10_common_countries, top_countries_high_rated, avg_rating_by_countries
+
+@st.fragment
+def countries_stats(model):
+    with st.expander("Countries Stats", key="countries_stats_panel", on_change="rerun") as panel:
+        if not panel.open:
+            return
+        world_map, top_10_common_countries, top_countries_high_rated, avg_rating_by_countries = countries_stats_data(model.fingerprint, model)
 
         st.markdown("""
             <style>
@@ -199,20 +178,7 @@ def countries_stats(final_df):
             </style>
             <p class="world-map-font">Your movies from across the world:</p>
             """, unsafe_allow_html=True)
-        fig1 = prepare_world_map(countries_df)
-        plot_world_map(fig1)
-        
-        fig2df = final_df.copy()
-        fig2df["countries"] = fig2df["countries"].str.split(", ")
-        fig2df = fig2df.explode("countries")
-        fig2df = fig2df[~fig2df["countries"].str.contains("show", case=False, na=False)]
-        countries_movies = fig2df.groupby("countries")["title"].apply(list).reset_index(name="Movies")
-
-        countries_count = fig2df["countries"].value_counts().reset_index()
-        countries_count.columns = ["Countries", "Count"]
-        countries_count = countries_count.merge(countries_movies, left_on="Countries", right_on="countries", how="left").drop(columns=["countries"])
-
-        top_10_common_countries = countries_count.head(10).sort_values(by="Count", ascending=True)
+        plot_world_map(world_map, hover_data=concise_hover_text(world_map["Movies"], world_map["movies_watched"]))
 
         st.markdown("""
             <style>
@@ -227,19 +193,9 @@ def countries_stats(final_df):
             </style>
             <p class="fig2-font">The countries that your most watched movies are from:</p>
             """, unsafe_allow_html=True)
-        fig2 = create_bar_graph(top_10_common_countries, x="Count", y="Countries", title="Most Watched Countries", color="rgb(102, 221, 103)", hover_data=top_10_common_countries["Movies"])
+        fig2 = create_bar_graph(top_10_common_countries, x="Count", y="Countries", title="Most Watched Countries", color="rgb(102, 221, 103)", hover_data=concise_hover_text(top_10_common_countries["Movies"], top_10_common_countries["Count"]))
         st.plotly_chart(fig2, use_container_width=True, config={"displayModeBar": False})
 
-        liked_movies_df = final_df[final_df["liked"] == True].copy()
-        liked_movies_df["countries"] = liked_movies_df["countries"].str.split(", ")
-        liked_movies_df = liked_movies_df.explode("countries")
-        liked_movies_df = liked_movies_df[~liked_movies_df["countries"].str.contains("show", case=False, na=False)]
-        liked_countries_movies = liked_movies_df.groupby("countries")["title"].apply(list).reset_index(name="Movies")
-        countries_counted = liked_movies_df["countries"].value_counts().reset_index()
-        countries_counted.columns = ["Countries", "Count"]
-        countries_counted = countries_counted.merge(liked_countries_movies, left_on="Countries", right_on="countries", how="left").drop(columns=["countries"])
-        top_countries_high_rated = countries_counted.head(10).sort_values(by="Count", ascending=True)
-
         st.markdown("""
             <style>
             .fig2-font {
@@ -253,7 +209,7 @@ def countries_stats(final_df):
             </style>
             <p class="fig2-font">The countries that your liked movies are from:</p>
             """, unsafe_allow_html=True)
-        fig3 = create_bar_graph(top_countries_high_rated, x="Count", y="Countries", title="Countries of the Movies You've Liked", color="rgb(239, 135, 51)", hover_data=top_countries_high_rated["Movies"])
+        fig3 = create_bar_graph(top_countries_high_rated, x="Count", y="Countries", title="Countries of the Movies You've Liked", color="rgb(239, 135, 51)", hover_data=concise_hover_text(top_countries_high_rated["Movies"], top_countries_high_rated["Count"]))
         st.plotly_chart(fig3, use_container_width=True, config={"displayModeBar": False})
         
         st.markdown("""
@@ -281,6 +237,4 @@ def countries_stats(final_df):
             </style>
             <p class="fig4-small-font">(From your 20 most watched countries in order)</p>
             """, unsafe_allow_html=True)
-        fig4df = final_df.copy()
-        fig4 = countries_with_rating(fig4df)
-        create_avg_rating_by_countries_graph_horizontal(fig4)
\ No newline at end of file
+        create_avg_rating_by_countries_graph_horizontal(avg_rating_by_countries)
\ No newline at end of file
@@ -1,21 +1,12 @@
 import plotly.express as px
 import streamlit as st
 import pandas as pd
+from parsing_scripts.film_model import facet_frame
+from visualize_scripts.facet_summary import concise_hover_text, facet_summary, mean_rating_table
+from visualize_scripts.stats_cache import cached_stats
 
 def create_bar_graph(data, x, y, title, color="skyblue", hover_data=None, ccs=None):
-    def concise_hover_text(movies_list):
-        if len(movies_list) <= 5:
-            return "<br>".join(movies_list)
-        else:
-            more_count = len(movies_list) - 5
-            displayed_movies = movies_list[:5]
-            return "<br>".join(displayed_movies) + f"<br>and {more_count} more..."
-
-    if hover_data is not None:
-        data = data.copy()
-        data["hover_text"] = hover_data.apply(concise_hover_text)
-    else:
-        data["hover_text"] = ""
+    data = data.assign(hover_text=hover_data if hover_data is not None else "")
 
     fig = px.bar(
         data, y=y, x=x, orientation="h",
@@ -44,33 +35,11 @@ def create_bar_graph(data, x, y, title, color="skyblue", hover_data=None, ccs=No
 
     return fig
 
-def director_with_rating(final_df):
-    final_df["director"] = final_df["director"].apply(lambda x: [director.strip().lower() for director in x.split(",")] if isinstance(x, str) else x)
-    df_exploded = final_df.explode("director")
-    df_exploded = df_exploded[~df_exploded["director"].str.contains("show", case=False, na=False)]
-    director_counts = df_exploded["director"].value_counts().reset_index(name="count").rename(columns={"index": "director"})
-    top20_directors = director_counts.nlargest(20, "count")
-    df_filtered = df_exploded.merge(top20_directors[["director"]], on="director")
-    df_filtered["rating"] = pd.to_numeric(df_filtered["rating"], errors="coerce")
-    avg_rating_by_director = df_filtered.groupby("director")["rating"].mean().reset_index(name="mean_rating")
-    avg_rating_by_director["mean_rating"] = avg_rating_by_director["mean_rating"].round(1)
-    avg_rating_by_director["director"] = avg_rating_by_director["director"].str.capitalize()
-    
-    return avg_rating_by_director
-
-def lowest_director_with_rating(final_df):
-    final_df["director"] = final_df["director"].apply(lambda x: [director.strip().lower() for director in x.split(",")] if isinstance(x, str) else x)
-    df_exploded = final_df.explode("director")
-    df_exploded = df_exploded[~df_exploded["director"].str.contains("show", case=False, na=False)]
-    director_counts = df_exploded["director"].value_counts().reset_index(name="count").rename(columns={"index": "director"})
-    top20_directors = director_counts.nsmallest(20, "count")
-    df_filtered = df_exploded.merge(top20_directors[["director"]], on="director")
-    df_filtered["rating"] = pd.to_numeric(df_filtered["rating"], errors="coerce")
-    avg_rating_by_director = df_filtered.groupby("director")["rating"].mean().reset_index(name="mean_rating")
-    avg_rating_by_director["mean_rating"] = avg_rating_by_director["mean_rating"].round(1)
-    avg_rating_by_director["director"] = avg_rating_by_director["director"].str.capitalize()
-    
-    return avg_rating_by_director
+def director_with_rating(director_summary):
+    return mean_rating_table(director_summary.nlargest(20, "count"), "director")
+
+def lowest_director_with_rating(director_summary):
+    return mean_rating_table(director_summary.nsmallest(20, "count"), "director")
 
 def create_avg_rating_by_director_graph_horizontal(avg_rating_by_director, title, color ,ccs=None):
     # avg_rating_by_director = avg_rating_by_director.sort_values('mean_rating', ascending=True)
@@ -105,17 +74,13 @@ def create_avg_rating_by_director_graph_horizontal(avg_rating_by_director, title
 
     st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
 
-def top_directors_top_genres(final_df):
-    final_df["director"] = final_df["director"].apply(lambda x: [director.strip().lower() for director in x.split(",")] if isinstance(x, str) else x)
-    director_df = final_df.explode("director")
-    director_df["director"] = director_df["director"].str.strip().str.lower()
-    director_df= director_df[~director_df["director"].str.contains(r"^Jr\.$", case=False, na=False)]
-    director_df = director_df[~director_df["director"].str.contains("show", case=False, na=False)]
+def top_directors_top_genres(model):
+    director_df = facet_frame(model, "director")
+    director_df["director"] = director_df["director"].str.lower()
 
-    director_df["genres"] = director_df["genres"].apply(lambda x: [genre.strip().lower() for genre in x.split(",")] if isinstance(x, str) else x)
-    director_df = director_df.explode("genres")
-    director_df["genres"] = director_df["genres"].str.strip().str.lower()
-    director_df = director_df[~director_df["genres"].str.contains("show", case=False, na=False)]
+    genre_df = facet_frame(model, "genres")
+    genre_df["genres"] = genre_df["genres"].str.lower()
+    director_df = director_df.merge(genre_df[["event_id", "genres"]], on="event_id", how="left")
 
     top_directors = director_df["director"].value_counts().head(10).index.tolist()
     director_genres = []
@@ -163,32 +128,28 @@ def plot_top_directors_top_genres(data):
 
     st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
 
-def director_stats(final_df):
-    with st.expander("Director Stats"):
-        director_df = final_df.copy()
-        director_df["director"] = director_df["director"].str.split(", ")
-        director_df = director_df.explode("director")
-        director_df= director_df[~director_df["director"].str.contains(r"^Jr\.$", case=False, na=False)]
-        director_df = director_df[~director_df["director"].str.contains("show", case=False, na=False)]
-        director_movies = director_df.groupby("director")["title"].apply(list).reset_index(name="Movies")
-
-        director_count = director_df["director"].value_counts().reset_index()
-        director_count.columns = ["Director", "Count"]
-        director_count = director_count.merge(director_movies, left_on="Director", right_on="director", how="left").drop(columns=["director"])
-
-        top_10_common_directors = director_count.head(10).sort_values(by="Count", ascending=True)
-        bottom_10_common_directors = director_count.tail(10)
-
-        liked_movies_df = final_df[final_df["liked"] == True].copy()
-        liked_movies_df["director"] = liked_movies_df["director"].str.split(", ")
-        liked_movies_df = liked_movies_df.explode("director")
-        liked_movies_df = liked_movies_df[~liked_movies_df["director"].str.contains(r"^Jr\.$", case=False, na=False)]
-        liked_movies_df = liked_movies_df[~liked_movies_df["director"].str.contains("show", case=False, na=False)]
-        liked_director_movies = liked_movies_df.groupby("director")["title"].apply(list).reset_index(name="Movies")
-        director_counted = liked_movies_df["director"].value_counts().reset_index()
-        director_counted.columns = ["Director", "Count"]
-        director_counted = director_counted.merge(liked_director_movies, left_on="Director", right_on="director", how="left").drop(columns=["director"])
-        top_directors_high_rated = director_counted.head(10).sort_values(by='Count', ascending=True)
+@cached_stats
+def director_stats_data(fingerprint, _model):
+    director_summary = facet_summary(_model, "director")
+    director_count = director_summary.rename(columns={"director": "Director", "count": "Count", "titles": "Movies"})
+
+    top_10_common_directors = director_count.head(10).sort_values(by="Count", ascending=True)
+    bottom_10_common_directors = director_count.tail(10)
+
+    director_counted = facet_summary(_model, "director", liked_only=True).rename(columns={"director": "Director", "count": "Count", "titles": "Movies"})
+    top_directors_high_rated = director_counted.head(10).sort_values(by='Count', ascending=True)
+
+    avg_rating_by_director = director_with_rating(director_summary)
+    lowest_avg_rating_by_director = lowest_director_with_rating(director_summary)
+    director_genres = top_directors_top_genres(_model)
+    return top_10_common_directors, bottom_10_common_directors, top_directors_high_rated, avg_rating_by_director, lowest_avg_rating_by_director, director_genres
+
+@st.fragment
+def director_stats(model):
+    with st.expander("Director Stats", key="director_stats_panel", on_change="rerun") as panel:
+        if not panel.open:
+            return
+        top_10_common_directors, bottom_10_common_directors, top_directors_high_rated, avg_rating_by_director, lowest_avg_rating_by_director, director_genres = director_stats_data(model.fingerprint, model)
 
         st.markdown("""
             <style>
@@ -202,7 +163,7 @@ def director_stats(final_df):
             </style>
             <p class="director-font">Most watched directors:</p>
             """, unsafe_allow_html=True)
-        fig1 = create_bar_graph(top_10_common_directors, x="Count", y="Director", title="Most Watched Directors", color="rgb(102, 221, 103)", hover_data=top_10_common_directors["Movies"])
+        fig1 = create_bar_graph(top_10_common_directors, x="Count", y="Director", title="Most Watched Directors", color="rgb(102, 221, 103)", hover_data=concise_hover_text(top_10_common_directors["Movies"], top_10_common_directors["Count"]))
         st.plotly_chart(fig1, use_container_width=True, config={"displayModeBar": False})
 
         st.markdown("""
@@ -217,7 +178,7 @@ def director_stats(final_df):
             </style>
             <p class="director-font">Least watched directors</p>
             """, unsafe_allow_html=True)
-        fig3 = create_bar_graph(bottom_10_common_directors, x="Count", y="Director", title="Least Watched Directors", color="rgb(101, 186, 239)",  hover_data=bottom_10_common_directors["Movies"])
+        fig3 = create_bar_graph(bottom_10_common_directors, x="Count", y="Director", title="Least Watched Directors", color="rgb(101, 186, 239)",  hover_data=concise_hover_text(bottom_10_common_directors["Movies"], bottom_10_common_directors["Count"]))
         st.plotly_chart(fig3, use_container_width=True, config={"displayModeBar": False})
 
         st.markdown("""
@@ -232,7 +193,7 @@ def director_stats(final_df):
             </style>
             <p class="director-font">Top directors from your liked movies:</p>
             """, unsafe_allow_html=True)
-        fig2 = create_bar_graph(top_directors_high_rated, x="Count", y="Director", title="Common Directors from Movies you've Liked", color="rgb(239, 135, 51)",  hover_data=top_directors_high_rated["Movies"])
+        fig2 = create_bar_graph(top_directors_high_rated, x="Count", y="Director", title="Common Directors from Movies you've Liked", color="rgb(239, 135, 51)",  hover_data=concise_hover_text(top_directors_high_rated["Movies"], top_directors_high_rated["Count"]))
         st.plotly_chart(fig2, use_container_width=True, config={"displayModeBar": False})
 
         st.markdown("""
@@ -259,8 +220,7 @@ def director_stats(final_df):
             </style>
             <p class="small-font">(From your 20 most watched directors)</p>
             """, unsafe_allow_html=True)
-        fig3 = director_with_rating(final_df)
-        create_avg_rating_by_director_graph_horizontal(fig3, title="Average Rating per Most Watched Director", color="#967BB6")
+        create_avg_rating_by_director_graph_horizontal(avg_rating_by_director, title="Average Rating per Most Watched Director", color="#967BB6")
 
         st.markdown("""
             <style>
@@ -286,8 +246,7 @@ def director_stats(final_df):
             </style>
             <p class="small-font">(From 20 of your least watched directors) (No data means you've lef their movie unrated)</p>
             """, unsafe_allow_html=True)
-        fig4 = lowest_director_with_rating(final_df)
-        create_avg_rating_by_director_graph_horizontal(fig4, title="Average Rating per Least Watched Director", color="#E6A9A9")
+        create_avg_rating_by_director_graph_horizontal(lowest_avg_rating_by_director, title="Average Rating per Least Watched Director", color="#E6A9A9")
 
         st.markdown("""
             <style>
@@ -313,5 +272,4 @@ def director_stats(final_df):
             </style>
             <p class="small-font">(Based on your watched movies)</p>
             """, unsafe_allow_html=True)
-        fig5 = top_directors_top_genres(final_df)
-        plot_top_directors_top_genres(fig5)
\ No newline at end of file
+        plot_top_directors_top_genres(director_genres)
\ No newline at end of file
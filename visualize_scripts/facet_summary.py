@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+from parsing_scripts.film_model import HIDDEN_NAME
+
+# hover text lists this many titles per bar, then how many more there are
+HOVER_TITLES = 5
+
+def first_titles(group_ids, titles, group_count, limit=HOVER_TITLES):
+    # the first `limit` titles of every group in row order and each group's size, without a list per row;
+    # a stable sort groups the rows and keeps them in order inside each group
+    order = np.argsort(group_ids, kind="stable")
+    sizes = np.bincount(group_ids, minlength=group_count)
+    starts = np.cumsum(sizes) - sizes
+    rank = np.arange(len(order)) - np.repeat(starts, sizes)
+    shown = np.minimum(sizes, limit)
+    kept = titles[order[rank < limit]].tolist()
+    ends = np.cumsum(shown).tolist()
+    return [kept[end - length:end] for end, length in zip(ends, shown.tolist())], sizes
+
+def concise_hover_text(titles, counts):
+    hover = ["<br>".join(map(str, shown)) + (f"<br>and {count - len(shown)} more..." if count > len(shown) else "") for shown, count in zip(titles, counts)]
+    return pd.Series(hover, index=titles.index, dtype=object)
+
+def facet_rows(model, facet, events, keep_hidden=False):
+    # expands events into (event, entity) rows using only integer arrays, in the same order as facet_frame.
+    # Link tables are built film by film, so each film's links are one contiguous, ordered run.
+    link = model.links[facet]
+    link_films = link["film_id"].to_numpy()
+    link_entities = link["entity_id"].to_numpy()
+    if not keep_hidden:
+        hidden = np.asarray(model.entities[facet].str.contains(HIDDEN_NAME, case=False), dtype=bool)
+        visible = ~hidden[link_entities]
+        link_films, link_entities = link_films[visible], link_entities[visible]
+
+    links_per_film = np.bincount(link_films, minlength=len(model.films))
+    first_link = np.cumsum(links_per_film) - links_per_film
+
+    film_ids = events["film_id"].to_numpy()
+    lengths = links_per_film[film_ids]
+    row_events = np.repeat(np.arange(len(film_ids)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    row_entities = link_entities[np.repeat(first_link[film_ids], lengths) + offsets]
+    return row_events, row_entities
+
+def facet_summary(model, facet, liked_only=False, keep_hidden=False, title_limit=HOVER_TITLES):
+    # one grouped pass over the (event, entity) rows: watch count, liked count, mean rating and the first titles
+    # per entity, most watched first, ties in the order the entities first appear
+    events = model.events[model.events["liked"]] if liked_only else model.events
+    row_events, row_entities = facet_rows(model, facet, events, keep_hidden)
+    names = model.entities[facet]
+    entity_count = len(names)
+
+    count = np.bincount(row_entities, minlength=entity_count)
+    liked = np.bincount(row_entities, weights=events["liked"].to_numpy()[row_events], minlength=entity_count)
+    ratings = events["rating"].to_numpy(dtype=float, na_value=np.nan)[row_events]
+    rated = ~np.isnan(ratings)
+    rated_count = np.bincount(row_entities[rated], minlength=entity_count)
+    rating_sum = np.bincount(row_entities[rated], weights=ratings[rated], minlength=entity_count)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_rating = rating_sum / rated_count
+
+    first_row = np.full(entity_count, len(row_entities))
+    seen, first_seen = np.unique(row_entities, return_index=True)
+    first_row[seen] = first_seen
+    titles = model.films["title"].to_numpy()[events["film_id"].to_numpy()[row_events]]
+    title_heads, _ = first_titles(row_entities, titles, entity_count, title_limit)
+
+    summary = pd.DataFrame({
+        facet: names,
+        "count": count,
+        "liked": liked.astype(np.int64),
+        "rated": rated_count,
+        "mean_rating": mean_rating,
+        "titles": title_heads,
+    })
+    summary = summary.iloc[np.lexsort((first_row, -count))]
+    return summary[summary["count"] > 0].reset_index(drop=True)
+
+def mean_rating_table(summary, facet):
+    # the rating charts list entities alphabetically, capitalized from lower case as they always have been
+    table = pd.DataFrame({facet: summary[facet].str.lower(), "mean_rating": summary["mean_rating"].round(1)})
+    table = table.sort_values(facet, kind="stable").reset_index(drop=True)
+    table[facet] = table[facet].str.capitalize()
+    return table
@@ -4,30 +4,27 @@ import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
 from datetime import datetime, timedelta
-
-def calculate_total_watched_time(final_df):
-    total_runtime = final_df["runtime"].sum()
+from parsing_scripts.film_model import event_films, facet_frame
+from visualize_scripts.facet_summary import concise_hover_text, facet_summary, mean_rating_table
+from visualize_scripts.stats_cache import cached_stats
+
+@cached_stats
+def total_watched_time_data(fingerprint, _model):
+    watched_df = event_films(_model)
+    total_runtime = watched_df["runtime"].sum()
     total_runtime_int = int(total_runtime)
-    max_index = final_df["title"].idxmax()
+    max_index = watched_df["title"].idxmax()
+    return total_runtime_int, max_index
+
+def calculate_total_watched_time(model):
+    total_runtime_int, max_index = total_watched_time_data(model.fingerprint, model)
     st.markdown(f"<u>You've watched a total of <span style='color: rgb(239, 135, 51);'>{total_runtime_int}</span> minutes of cinema!</u>", unsafe_allow_html=True)
     st.write("Check out some stats below: ")
     # st.write(f"That means, you"ve watched over {max_index} movies")
     return total_runtime_int, max_index
 
 def create_bar_graph(data, x, y, title, color="skyblue", hover_data=None, ccs=None):
-    def concise_hover_text(movies_list):
-        if len(movies_list) <= 5:
-            return "<br>".join(movies_list)
-        else:
-            more_count = len(movies_list) - 5
-            displayed_movies = movies_list[:5]
-            return "<br>".join(displayed_movies) + f"<br>and {more_count} more..."
-
-    if hover_data is not None:
-        data = data.copy()
-        data["hover_text"] = hover_data.apply(concise_hover_text)
-    else:
-        data["hover_text"] = ""
+    data = data.assign(hover_text=hover_data if hover_data is not None else "")
 
     fig = px.bar(
         data, y=y, x=x, orientation="h",
@@ -89,15 +86,10 @@ def create_genre_over_time_graph(most_watched_genre_per_month):
 
     st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
 
-def genre_stats_over_months(final_df):
-    final_df["watched_date"] = pd.to_datetime(final_df["watched_date"], format="%d %b %Y")
-
+def genre_stats_over_months(genre_df):
     last_12_months = datetime.now() - timedelta(days=395)
-    filtered_df = final_df[final_df["watched_date"] >= last_12_months]
-
-    all_genres = filtered_df.assign(genres=filtered_df["genres"].str.split(", ")).explode("genres")
-    all_genres = all_genres[~all_genres["genres"].str.contains("show", case=False, na=False)]
-    all_genres["year_month"] = all_genres["watched_date"].dt.to_period("M")
+    all_genres = genre_df[genre_df["watched_date"] >= last_12_months]
+    all_genres = all_genres.assign(year_month=all_genres["watched_date"].dt.to_period("M"))
 
     monthly_genre_counts = all_genres.groupby(["year_month", "genres"]).size().reset_index(name="counts")
 
@@ -112,15 +104,10 @@ def genre_stats_over_months(final_df):
 
     return most_watched_genre_per_month.tail(13)
 
-def calculate_diversity(final_df):
-    final_df["watched_date"] = pd.to_datetime(final_df["watched_date"], format="%d %b %Y")
-
+def calculate_diversity(genre_df):
     last_12_months = datetime.now() - timedelta(days=395)
-    filtered_df = final_df[final_df["watched_date"] >= last_12_months]
-
-    all_genres = filtered_df.assign(genres=filtered_df["genres"].str.split(", ")).explode("genres")
-    all_genres = all_genres[~all_genres["genres"].str.contains("show", case=False, na=False)]
-    all_genres["year_month"] = all_genres["watched_date"].dt.to_period("M")
+    all_genres = genre_df[genre_df["watched_date"] >= last_12_months]
+    all_genres = all_genres.assign(year_month=all_genres["watched_date"].dt.to_period("M"))
 
     monthly_genre_counts = all_genres.groupby(["year_month", "genres"]).size().reset_index(name="counts")
     monthly_totals = all_genres.groupby("year_month").size().reset_index(name="total_movies")
@@ -192,16 +179,8 @@ def plot_diversity(diversity_and_totals_df):
     
     st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
 
-def genre_with_rating(final_df):
-    final_df["genres"] = final_df["genres"].apply(lambda x: [genre.strip().lower() for genre in x.split(",")] if isinstance(x, str) else x)
-    df_exploded = final_df.explode("genres")
-    df_exploded = df_exploded[~df_exploded["genres"].str.contains("show", case=False, na=False)]
-    df_exploded["rating"] = pd.to_numeric(df_exploded["rating"], errors="coerce")
-    avg_rating_by_genre = df_exploded.groupby("genres")["rating"].mean().reset_index(name="mean_rating")
-    avg_rating_by_genre["mean_rating"] = avg_rating_by_genre["mean_rating"].round(1)
-    avg_rating_by_genre["genres"] = avg_rating_by_genre["genres"].str.capitalize()
-    
-    return avg_rating_by_genre
+def genre_with_rating(genre_summary):
+    return mean_rating_table(genre_summary, "genres")
 
 def create_avg_rating_by_genre_graph_horizontal(avg_rating_by_genre):
     # avg_rating_by_genre = avg_rating_by_genre.sort_values("mean_rating", ascending=True)
@@ -236,30 +215,30 @@ def create_avg_rating_by_genre_graph_horizontal(avg_rating_by_genre):
 
     st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
 
-def genre_stats(final_df):
-    with st.expander("Genre Stats"):
-        genre_df = final_df.copy()
-        genre_df["genres"] = genre_df["genres"].str.split(", ")
-        genre_df = genre_df.explode("genres")
-        genre_df = genre_df[~genre_df["genres"].str.contains("show", case=False, na=False)]
-        genre_movies = genre_df.groupby("genres")["title"].apply(list).reset_index(name="Movies")
-
-        genre_count = genre_df["genres"].value_counts().reset_index()
-        genre_count.columns = ["Genres", "Count"]
-        genre_count = genre_count.merge(genre_movies, left_on="Genres", right_on="genres", how="left").drop(columns=["genres"])
-
-        top_10_common_genres = genre_count.head(10).sort_values(by="Count", ascending=True)
-        top_10_uncommon_genres = genre_count.tail(10)
-
-        liked_movies_df = genre_df[genre_df["liked"] == True].copy()
-        liked_movies_df["genres"] = liked_movies_df["genres"].str.split(", ")
-        liked_movies_df = liked_movies_df.explode("genres")
-        liked_movies_df = liked_movies_df[~liked_movies_df["genres"].str.contains("show", case=False, na=False)]
-        liked_high_rated_genres = liked_movies_df.groupby("genres")["title"].apply(list).reset_index(name="Movies")
-        high_rated_genres_counted = liked_movies_df["genres"].value_counts().reset_index()
-        high_rated_genres_counted.columns = ["Genres", "Count"]
-        high_rated_genres_counted = high_rated_genres_counted.merge(liked_high_rated_genres, left_on="Genres", right_on="genres", how="left").drop(columns=["genres"])
-        top_genres_high_rated = high_rated_genres_counted.head(10).sort_values(by="Genres", ascending=True)
+@cached_stats
+def genre_stats_data(fingerprint, today, _model):
+    # today is part of the key because the monthly charts cover the last year
+    genre_df = facet_frame(_model, "genres")
+    genre_summary = facet_summary(_model, "genres")
+    genre_count = genre_summary.rename(columns={"genres": "Genres", "count": "Count", "titles": "Movies"})
+
+    top_10_common_genres = genre_count.head(10).sort_values(by="Count", ascending=True)
+    top_10_uncommon_genres = genre_count.tail(10)
+
+    high_rated_genres_counted = facet_summary(_model, "genres", liked_only=True).rename(columns={"genres": "Genres", "count": "Count", "titles": "Movies"})
+    top_genres_high_rated = high_rated_genres_counted.head(10).sort_values(by="Genres", ascending=True)
+
+    most_watched_genre_per_month = genre_stats_over_months(genre_df)
+    calculated_diversity = calculate_diversity(genre_df)
+    average_rating_per_genre = genre_with_rating(genre_summary)
+    return top_10_common_genres, top_10_uncommon_genres, top_genres_high_rated, most_watched_genre_per_month, calculated_diversity, average_rating_per_genre
+
+@st.fragment
+def genre_stats(model):
+    with st.expander("Genre Stats", key="genre_stats_panel", on_change="rerun") as panel:
+        if not panel.open:
+            return
+        top_10_common_genres, top_10_uncommon_genres, top_genres_high_rated, most_watched_genre_per_month, calculated_diversity, average_rating_per_genre = genre_stats_data(model.fingerprint, datetime.now().date(), model)
 
         st.markdown("""
             <style>
@@ -273,7 +252,7 @@ def genre_stats(final_df):
             </style>
             <p class="big-font">Most watched genres:</p>
             """, unsafe_allow_html=True)
-        fig1 = create_bar_graph(top_10_common_genres, x="Count", y="Genres", title="Most Watched Genres", color="rgb(102, 221, 103)", hover_data=top_10_common_genres["Movies"])
+        fig1 = create_bar_graph(top_10_common_genres, x="Count", y="Genres", title="Most Watched Genres", color="rgb(102, 221, 103)", hover_data=concise_hover_text(top_10_common_genres["Movies"], top_10_common_genres["Count"]))
         st.plotly_chart(fig1, use_container_width=True, config={"displayModeBar": False})
 
         st.markdown("""
@@ -288,7 +267,7 @@ def genre_stats(final_df):
             </style>
             <p class="big-font">Least watched genres:</p>
             """, unsafe_allow_html=True)
-        fig2 = create_bar_graph(top_10_uncommon_genres, x="Count", y="Genres", title="Least Watched Genres", color="rgb(101, 186, 239)", hover_data=top_10_uncommon_genres["Movies"])
+        fig2 = create_bar_graph(top_10_uncommon_genres, x="Count", y="Genres", title="Least Watched Genres", color="rgb(101, 186, 239)", hover_data=concise_hover_text(top_10_uncommon_genres["Movies"], top_10_uncommon_genres["Count"]))
         st.plotly_chart(fig2, use_container_width=True, config={"displayModeBar": False})
 
         st.markdown("""
@@ -303,7 +282,7 @@ def genre_stats(final_df):
             </style>
             <p class="big-font">Top genres from your liked movies:</p>
             """, unsafe_allow_html=True)
-        fig3 = create_bar_graph(top_genres_high_rated, x="Count", y="Genres", title="Common Genres from Movies you've Liked", color="rgb(239, 135, 51)", hover_data=high_rated_genres_counted["Movies"])
+        fig3 = create_bar_graph(top_genres_high_rated, x="Count", y="Genres", title="Common Genres from Movies you've Liked", color="rgb(239, 135, 51)", hover_data=concise_hover_text(top_genres_high_rated["Movies"], top_genres_high_rated["Count"]))
         st.plotly_chart(fig3, use_container_width=True, config={"displayModeBar": False})
 
         st.markdown("""
@@ -318,7 +297,6 @@ def genre_stats(final_df):
             </style>
             <p class="big-font">The most watched genres per month from the past year:</p>
             """, unsafe_allow_html=True)
-        most_watched_genre_per_month = genre_stats_over_months(genre_df)
         create_genre_over_time_graph(most_watched_genre_per_month)
 
         st.markdown("""
@@ -344,7 +322,6 @@ def genre_stats(final_df):
             </style>
             <p class="snail-font">(The higher the Shannon Diversity Index, the more genres you've explored that month)</p>
             """, unsafe_allow_html=True)
-        calculated_diversity = calculate_diversity(genre_df)
         plot_diversity(calculated_diversity)
 
         st.markdown("""
@@ -359,5 +336,4 @@ def genre_stats(final_df):
             </style>
             <p class="average">Average Rating per Genre:</p>
             """, unsafe_allow_html=True)
-        average_rating_per_genre = genre_with_rating(genre_df)
         create_avg_rating_by_genre_graph_horizontal(average_rating_per_genre)
\ No newline at end of file
@@ -2,33 +2,21 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import numpy as np
+from parsing_scripts.film_model import event_films
+from visualize_scripts.facet_summary import concise_hover_text, first_titles
+from visualize_scripts.stats_cache import cached_stats
 
 def prepare_histogram(final_df):
-    final_df['release_year'] = pd.to_numeric(final_df['release_year'], errors='coerce')
-    final_df = final_df.dropna(subset=['release_year']).copy()
-    final_df['release_year'] = final_df['release_year'].astype(int)
-    release_year_movies = final_df.groupby('release_year')['title'].apply(list).reset_index(name='Movies')
-
-    release_year_count = final_df['release_year'].value_counts().reset_index()
-    release_year_count.columns = ["Release Year", "Count"]
-    release_year_count = release_year_count.merge(release_year_movies, left_on="Release Year", right_on="release_year", how="left").drop(columns=["release_year"])
-    
+    final_df = final_df.dropna(subset=['release_year']).astype({'release_year': int})
+    year_ids, years = pd.factorize(final_df['release_year'])
+    movies, counts = first_titles(year_ids, final_df['title'].to_numpy(), len(years))
+    release_year_count = pd.DataFrame({"Count": counts, "Movies": movies}, index=pd.Index(years, name="Release Year"))
+    release_year_count = release_year_count.sort_values("Count", ascending=False, kind="stable")
+
     return final_df, release_year_count
 
 def plot_histogram(data, hover_data=None):
-    def concise_hover_text(movies_list):
-        if len(movies_list) <= 5:
-            return "<br>".join(movies_list)
-        else:
-            more_count = len(movies_list) - 5
-            displayed_movies = movies_list[:5]
-            return "<br>".join(displayed_movies) + f"<br>and {more_count} more..."
-        
-    if hover_data is not None:
-        data = data.copy()
-        data['hover_text'] = hover_data.apply(concise_hover_text)
-    else:
-        data['hover_text'] = ""
+    data = data.assign(hover_text=data['release_year'].map(hover_data) if hover_data is not None else "")
 
     min_year = data['release_year'].min()
     max_year = data['release_year'].max()
@@ -56,33 +44,21 @@ def plot_histogram(data, hover_data=None):
     st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
     
 def prepare_average_rating(final_df):
-    final_df['release_year'] = pd.to_numeric(final_df['release_year'], errors='coerce')
-    final_df = final_df.dropna(subset=['release_year']).copy()
-    final_df['release_year'] = final_df['release_year'].astype(int)
-    final_df['rating'] = pd.to_numeric(final_df['rating'], errors='coerce')
-    final_df = final_df.dropna(subset=['rating']).copy()
+    final_df = final_df.dropna(subset=['release_year', 'rating']).astype({'release_year': int, 'rating': float})
     
     avg_rating_by_release_year = final_df.groupby('release_year')['rating'].mean().reset_index(name='mean_rating')
     avg_rating_by_release_year['mean_rating'] = avg_rating_by_release_year['mean_rating'].round(1)
 
-    release_year_movies = final_df.groupby('release_year')['title'].apply(list).reset_index(name='Movies')
-    avg_rating_by_release_year = avg_rating_by_release_year.merge(release_year_movies, on="release_year", how="left")
+    # groupby sorts the years, so factorize them sorted too
+    year_ids, _ = pd.factorize(final_df['release_year'], sort=True)
+    movies, counts = first_titles(year_ids, final_df['title'].to_numpy(), len(avg_rating_by_release_year))
+    avg_rating_by_release_year['Movies'] = movies
+    avg_rating_by_release_year['Count'] = counts
 
     return avg_rating_by_release_year
 
 def plot_average_rating(data):
-    def concise_hover_text(movies_list):
-        if len(movies_list) <= 5:
-            return "<br>".join(movies_list)
-        else:
-            more_count = len(movies_list) - 5
-            displayed_movies = movies_list[:5]
-            return "<br>".join(displayed_movies) + f"<br>and {more_count} more..."
-        
-    if 'Movies' in data.columns:
-        data['hover_text'] = data['Movies'].apply(concise_hover_text)
-    else:
-        data['hover_text'] = ""
+    data = data.assign(hover_text=concise_hover_text(data['Movies'], data['Count']) if 'Movies' in data.columns else "")
     
     fig = px.bar(
         data_frame=data,
@@ -105,9 +81,20 @@ def plot_average_rating(data):
     
     st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
 
-def release_year_stats(final_df):
-    with st.expander("Release Year Stats"):
-        release_year_df = final_df.copy()
+@cached_stats
+def release_year_stats_data(fingerprint, _model):
+    release_year_df = event_films(_model)
+    watched_years, release_year_count = prepare_histogram(release_year_df)
+    avg_rating_by_release_year = prepare_average_rating(release_year_df)
+    # the histogram bins the watches itself, so their release years are all it needs
+    return watched_years[['release_year']], release_year_count, avg_rating_by_release_year
+
+@st.fragment
+def release_year_stats(model):
+    with st.expander("Release Year Stats", key="release_year_stats_panel", on_change="rerun") as panel:
+        if not panel.open:
+            return
+        watched_years, release_year_count, avg_rating_by_release_year = release_year_stats_data(model.fingerprint, model)
 
         st.markdown("""
             <style>
@@ -122,8 +109,7 @@ def release_year_stats(final_df):
             </style>
             <p class="fig-one-release-font">Your watched movies and their release years:</p>
             """, unsafe_allow_html=True)
-        fig1, release_year_count = prepare_histogram(release_year_df)
-        plot_histogram(fig1, hover_data=release_year_count["Movies"])
+        plot_histogram(watched_years, hover_data=concise_hover_text(release_year_count["Movies"], release_year_count["Count"]))
 
         st.markdown("""
             <style>
@@ -138,6 +124,5 @@ def release_year_stats(final_df):
             </style>
             <p class="fig-two-release-font">Your watched movies sorted by release date and their average ratings:</p>
             """, unsafe_allow_html=True)
-        fig2 = prepare_average_rating(release_year_df)
-        plot_average_rating(fig2)
+        plot_average_rating(avg_rating_by_release_year)
         
\ No newline at end of file
@@ -0,0 +1,8 @@
+import streamlit as st
+
+# per panel, enough for a few users' histories at once; each entry holds only the small frames a panel draws
+STATS_CACHE_ENTRIES = 16
+
+def cached_stats(compute):
+    # compute(fingerprint, _model): the model's fingerprint is the key, the model itself is never hashed
+    return st.cache_data(max_entries=STATS_CACHE_ENTRIES, show_spinner=False)(compute)
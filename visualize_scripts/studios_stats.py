@@ -1,27 +1,17 @@
 import networkx as nx
 import plotly.express as px
 from itertools import combinations
-import pandas as pd
 import matplotlib.pyplot as plt
 from community import community_louvain
 from matplotlib.colors import LinearSegmentedColormap
 import streamlit as st
 import numpy as np
+from parsing_scripts.film_model import event_films, film_names
+from visualize_scripts.facet_summary import concise_hover_text, facet_summary, mean_rating_table
+from visualize_scripts.stats_cache import cached_stats
 
 def create_bar_graph(data, x, y, title, color="skyblue", hover_data=None, ccs=None):
-    def concise_hover_text(movies_list):
-        if len(movies_list) <= 5:
-            return "<br>".join(movies_list)
-        else:
-            more_count = len(movies_list) - 5
-            displayed_movies = movies_list[:5]
-            return "<br>".join(displayed_movies) + f"<br>and {more_count} more..."
-
-    if hover_data is not None:
-        data = data.copy()
-        data['hover_text'] = hover_data.apply(concise_hover_text)
-    else:
-        data['hover_text'] = ""
+    data = data.assign(hover_text=hover_data if hover_data is not None else "")
 
     fig = px.bar(
         data, y=y, x=x, orientation="h",
@@ -50,19 +40,8 @@ def create_bar_graph(data, x, y, title, color="skyblue", hover_data=None, ccs=No
 
     return fig
 
-def studio_with_rating(final_df):
-    final_df["studios"] = final_df["studios"].apply(lambda x: [studios.strip().lower() for studios in x.split(",")] if isinstance(x, str) else x)
-    df_exploded = final_df.explode("studios")
-    df_exploded = df_exploded[~df_exploded["studios"].str.contains("show", case=False, na=False)]
-    studios_counts = df_exploded["studios"].value_counts().reset_index(name="count").rename(columns={"index": "studios"})
-    top20_studios = studios_counts.nlargest(20, "count")
-    df_filtered = df_exploded.merge(top20_studios[["studios"]], on="studios")
-    df_filtered["rating"] = pd.to_numeric(df_filtered["rating"], errors="coerce")
-    avg_rating_by_studios = df_filtered.groupby("studios")["rating"].mean().reset_index(name="mean_rating")
-    avg_rating_by_studios["mean_rating"] = avg_rating_by_studios["mean_rating"].round(1)
-    avg_rating_by_studios["studios"] = avg_rating_by_studios["studios"].str.capitalize()
-    
-    return avg_rating_by_studios
+def studio_with_rating(studio_summary):
+    return mean_rating_table(studio_summary.nlargest(20, "count"), "studios")
 
 def create_avg_rating_by_studios_graph_horizontal(avg_rating_by_studios, title, color, ccs=None):
     # avg_rating_by_studios = avg_rating_by_studios.sort_values('mean_rating', ascending=True)
@@ -101,8 +80,8 @@ def build_studio_collaboration_network(final_df):
     G = nx.Graph()
 
     for index, row in final_df.iterrows():
-        if pd.notna(row['studios']):
-            studios = row['studios'].split(', ')
+        if isinstance(row['studios'], list):
+            studios = row['studios']
             for studio_pair in combinations(studios, 2):
                 if G.has_edge(*studio_pair):
                     G[studio_pair[0]][studio_pair[1]]['weight'] += 1
@@ -130,20 +109,21 @@ def iterative_adjust_positions(pos, min_distance=0.1, max_iterations=100):
     adjusted_pos = {node: pos for node, pos in zip(pos.keys(), pos_np)}
     return adjusted_pos
 
-def visualize_studio_network(G):
+def studio_network_layout(G):
     partition = community_louvain.best_partition(G)
     community_colors = {node: partition[node] for node in G.nodes()}
-    
+    pos = nx.spring_layout(G, k=0.6, iterations=50)
+    adjusted_pos = iterative_adjust_positions(pos, min_distance=0.4, max_iterations=100)
+    return community_colors, adjusted_pos
+
+def visualize_studio_network(G, community_colors, adjusted_pos):
     colors = [
         '#b9d9dc', '#a8dadc', '#95d0d3', '#82c5ca', '#6fbac1',
         '#9de2d0', '#b5e4ca', '#cce7c4', '#d7e8bc',
         '#f1d1a9', '#f4b880', '#f79e6d', '#ffb35c', '#ffbf70', '#ffcb85'
     ]
     custom_cmap = LinearSegmentedColormap.from_list("custom_expanded", colors, N=256)
-    
-    pos = nx.spring_layout(G, k=0.6, iterations=50)
 
-    adjusted_pos = iterative_adjust_positions(pos, min_distance=0.4, max_iterations=100)
     fig, ax = plt.subplots(figsize=(8, 8))
     fig.set_facecolor("#0F1116")
     ax.set_facecolor("#ffffff")
@@ -155,15 +135,9 @@ def visualize_studio_network(G):
     plt.axis('off')
     st.pyplot(plt.gcf())
 
-def prepare_studio_like_data(final_df):
-    final_df = final_df.copy()
-    final_df['studios'] = final_df['studios'].str.split(", ")
-    final_df = final_df.explode('studios')
-
-    studio_stats = final_df.groupby('studios').agg(
-        total_movies=('studios', 'size'),
-        liked_movies=('liked', lambda x: x.sum())
-    ).reset_index()
+def prepare_studio_like_data(model):
+    studio_summary = facet_summary(model, "studios", keep_hidden=True)
+    studio_stats = studio_summary[['studios']].assign(total_movies=studio_summary['count'], liked_movies=studio_summary['liked'])
 
     studio_stats['liked_percentage'] = ((studio_stats['liked_movies'] / studio_stats['total_movies']) * 100).round(0)
 
@@ -200,31 +174,35 @@ def plot_studio_liked_percentage(top_studios):
     
     st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
 
-def studio_stats(final_df):
-    with st.expander("Studio Stats"):
-        studio_df = final_df.copy()
-        studio_df['studios'] = studio_df['studios'].str.split(", ")
-        studio_df = studio_df.explode('studios')
-        studio_df = studio_df[~studio_df['studios'].str.contains("show", case=False, na=False)]
-        studio_movies = studio_df.groupby('studios')['title'].apply(list).reset_index(name='Movies')
-        
-        studio_count = studio_df['studios'].value_counts().reset_index()
-        studio_count.columns = ["Studio", "Count"]
-        studio_count = studio_count.merge(studio_movies, left_on="Studio", right_on="studios", how="left").drop(columns=["studios"])
-
-        top_10_common_studios = studio_count.head(10).sort_values(by="Count", ascending=True)
-        bottom_10_common_studios = studio_count.tail(10)
-
-        liked_movies_df = final_df[final_df["liked"] == True].copy()
-        liked_movies_df["studios"] = liked_movies_df["studios"].str.split(", ")
-        liked_movies_df = liked_movies_df.explode("studios")
-        liked_movies_df = liked_movies_df[~liked_movies_df["studios"].str.contains(r"^Jr\.$", case=False, na=False)]
-        liked_movies_df = liked_movies_df[~liked_movies_df["studios"].str.contains("show", case=False, na=False)]
-        liked_studios_movies = liked_movies_df.groupby("studios")["title"].apply(list).reset_index(name="Movies")
-        studios_counted = liked_movies_df["studios"].value_counts().reset_index()
-        studios_counted.columns = ["Studio", "Count"]
-        studios_counted = studios_counted.merge(liked_studios_movies, left_on="Studio", right_on="studios", how="left").drop(columns=["studios"])
-        top_studios_high_rated = studios_counted.head(10).sort_values(by='Count', ascending=True)
+@cached_stats
+def studio_stats_data(fingerprint, _model):
+    studio_summary = facet_summary(_model, "studios")
+    studio_count = studio_summary.rename(columns={"studios": "Studio", "count": "Count", "titles": "Movies"})
+
+    top_10_common_studios = studio_count.head(10).sort_values(by="Count", ascending=True)
+    bottom_10_common_studios = studio_count.tail(10)
+
+    studios_counted = facet_summary(_model, "studios", liked_only=True).rename(columns={"studios": "Studio", "count": "Count", "titles": "Movies"})
+    top_studios_high_rated = studios_counted.head(10).sort_values(by='Count', ascending=True)
+
+    avg_rating_by_studios = studio_with_rating(studio_summary)
+
+    watched_df = event_films(_model)
+    watched_df['studios'] = watched_df['film_id'].map(film_names(_model, "studios"))
+    top_rated_df = watched_df.sort_values(by='rating', ascending=False, kind='stable').head(10)
+    top_rated_df = top_rated_df.assign(studios=top_rated_df['studios'].apply(lambda x: x[:5] if isinstance(x, list) else x))
+    grab_connections = build_studio_collaboration_network(top_rated_df)
+    community_colors, adjusted_pos = studio_network_layout(grab_connections)
+
+    top_studios = prepare_studio_like_data(_model)
+    return top_10_common_studios, bottom_10_common_studios, top_studios_high_rated, avg_rating_by_studios, grab_connections, community_colors, adjusted_pos, top_studios
+
+@st.fragment
+def studio_stats(model):
+    with st.expander("Studio Stats", key="studio_stats_panel", on_change="rerun") as panel:
+        if not panel.open:
+            return
+        top_10_common_studios, bottom_10_common_studios, top_studios_high_rated, avg_rating_by_studios, grab_connections, community_colors, adjusted_pos, top_studios = studio_stats_data(model.fingerprint, model)
 
         st.markdown("""
             <style>
@@ -238,7 +216,7 @@ def studio_stats(final_df):
             </style>
             <p class="big-font">Most watched studios:</p>
             """, unsafe_allow_html=True)
-        fig1 = create_bar_graph(top_10_common_studios, x="Count", y="Studio", title="Most Watched Film Studios", color="rgb(102, 221, 103)", hover_data=top_10_common_studios["Movies"])
+        fig1 = create_bar_graph(top_10_common_studios, x="Count", y="Studio", title="Most Watched Film Studios", color="rgb(102, 221, 103)", hover_data=concise_hover_text(top_10_common_studios["Movies"], top_10_common_studios["Count"]))
         st.plotly_chart(fig1, use_container_width=True, config={"displayModeBar": False})
 
         st.markdown("""
@@ -253,7 +231,7 @@ def studio_stats(final_df):
             </style>
             <p class="studios-font">Least watched studios</p>
             """, unsafe_allow_html=True)
-        fig2 = create_bar_graph(bottom_10_common_studios, x="Count", y="Studio", title="Least Watched Film Studios", color="rgb(101, 186, 239)", hover_data=bottom_10_common_studios["Movies"])
+        fig2 = create_bar_graph(bottom_10_common_studios, x="Count", y="Studio", title="Least Watched Film Studios", color="rgb(101, 186, 239)", hover_data=concise_hover_text(bottom_10_common_studios["Movies"], bottom_10_common_studios["Count"]))
         st.plotly_chart(fig2, use_container_width=True, config={"displayModeBar": False})
 
         st.markdown("""
@@ -268,7 +246,7 @@ def studio_stats(final_df):
             </style>
             <p class="studios-font">Top studios from your liked movies:</p>
             """, unsafe_allow_html=True)
-        fig3 = create_bar_graph(top_studios_high_rated, x="Count", y="Studio", title="Common Film Studios from Movies you've Liked", color="rgb(239, 135, 51)", hover_data=top_studios_high_rated["Movies"])
+        fig3 = create_bar_graph(top_studios_high_rated, x="Count", y="Studio", title="Common Film Studios from Movies you've Liked", color="rgb(239, 135, 51)", hover_data=concise_hover_text(top_studios_high_rated["Movies"], top_studios_high_rated["Count"]))
         st.plotly_chart(fig3, use_container_width=True, config={"displayModeBar": False})
 
         st.markdown("""
@@ -295,8 +273,7 @@ def studio_stats(final_df):
             </style>
             <p class="small-font">(From your 20 most watched film studios)</p>
             """, unsafe_allow_html=True)
-        fig4 = studio_with_rating(studio_df)
-        create_avg_rating_by_studios_graph_horizontal(fig4, title="Average Rating per Most Watched Film Studios", color="#ff6961")
+        create_avg_rating_by_studios_graph_horizontal(avg_rating_by_studios, title="Average Rating per Most Watched Film Studios", color="#ff6961")
         
         st.markdown("""
         <p style="font-size: 25px; font-weight: 700; margin-bottom: 20px; position: relative; z-index: 1000;">Film Studio's Network in Your Top Rated Movies:</p>
@@ -305,10 +282,7 @@ def studio_stats(final_df):
         st.markdown("""
         <p style="font-size: 15px; margin-top: -10px; z-index: 410; position: absolute;">(Shows film studios that collaborated in your top 10 rated movies. Bigger node size = more connections)</p>
         """, unsafe_allow_html=True)
-        top_rated_df = final_df.sort_values(by='rating', ascending=False).head(10)
-        top_rated_df['studios'] = top_rated_df['studios'].apply(lambda x: ', '.join(x.split(', ')[:5]) if isinstance(x, str) else x)
-        grab_connections = build_studio_collaboration_network(top_rated_df)
-        visualize_studio_network(grab_connections)
+        visualize_studio_network(grab_connections, community_colors, adjusted_pos)
 
         st.markdown("""
             <style>
@@ -334,5 +308,4 @@ def studio_stats(final_df):
             </style>
             <p class="percentage-small-font">(From your 15 most watched film studios)</p>
             """, unsafe_allow_html=True)
-        fig5 = prepare_studio_like_data(final_df)
-        plot_studio_liked_percentage(fig5)
\ No newline at end of file
+        plot_studio_liked_percentage(top_studios)
\ No newline at end of file